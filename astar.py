@@ -1,14 +1,17 @@
-from settings import ROWS, COLS
-
 def heuristic(a, b):
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
-def astar(start, goal, grid_matrix):
+def astar(start, goal, grid_matrix, cost_map=None):
+    # cost_map (optional): extra cost of stepping onto each cell, indexed
+    # cost_map[r][c]; an infinite cost blocks the cell like a building
+    if hasattr(cost_map, "tolist"):
+        cost_map = cost_map.tolist()  # Plain lists index much faster than numpy in the loop below
     import heapq
     queue = []
     heapq.heappush(queue, (0, start))
     came_from = {}
     cost_so_far = {start: 0}
+    rows, cols = len(grid_matrix), len(grid_matrix[0])
 
     while queue:
         _, current = heapq.heappop(queue)
@@ -20,10 +23,13 @@ def astar(start, goal, grid_matrix):
             nx, ny = current[0] + dx, current[1] + dy
             neighbor = (nx, ny)
 
-            if 0 <= nx < ROWS and 0 <= ny < COLS:
+            if 0 <= nx < rows and 0 <= ny < cols:
                 neighbor_cell = grid_matrix[nx][ny]
                 if neighbor_cell.type not in ["building"]:
-                    new_cost = cost_so_far[current] + 1
+                    step_cost = 1 if cost_map is None else 1 + cost_map[nx][ny]
+                    if step_cost == float("inf"):
+                        continue
+                    new_cost = cost_so_far[current] + step_cost
                     if neighbor not in cost_so_far or new_cost < cost_so_far[neighbor]:
                         cost_so_far[neighbor] = new_cost
                         priority = new_cost + heuristic(goal, neighbor)
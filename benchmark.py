@@ -0,0 +1,396 @@
+"""
+Benchmark suite for the simulation hot paths.
+
+Every benchmark builds its inputs from a fixed seed so that runs are
+comparable, and the results are written as JSON for regression tracking:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --only astar movers --repeat 10
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # Run without opening a window
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import pygame
+
+from settings import ROWS, COLS, WIDTH, HEIGHT, CELL_SIZE, DETECTOR_ONNX_PATH
+from grid import Cell
+from astar import astar
+from pedestrian import PedestrianManager
+from garbage import Garbage
+from rng import SimulationRNG
+
+
+def measure(fn, repeat=5, number=1):
+    """
+    Calls fn `number` times per round for `repeat` rounds.
+    Returns per-call timing statistics in microseconds.
+    """
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number * 1e6)
+    return {
+        "repeat": repeat,
+        "number": number,
+        "min_us": min(rounds),
+        "median_us": statistics.median(rounds),
+        "mean_us": statistics.fmean(rounds),
+    }
+
+
+def make_grid(rows, cols, density, seed):
+    """Builds a rows x cols grid with a seeded fraction of building cells."""
+    rng = random.Random(seed)
+    grid = [[Cell(r, c) for c in range(cols)] for r in range(rows)]
+    corners = {0, rows * cols - 1}
+    free = [i for i in range(rows * cols) if i not in corners]
+    for idx in rng.sample(free, int(density * rows * cols)):
+        grid[idx // cols][idx % cols].set_type("building")
+    return grid
+
+
+def free_cells(grid, rng, count):
+    """Picks `count` distinct empty cells of the grid."""
+    cells = [(r, c) for r, row in enumerate(grid) for c, cell in enumerate(row) if cell.type == "empty"]
+    return rng.sample(cells, min(count, len(cells)))
+
+
+def bench_astar(args):
+    results = []
+    for size in (10, 50, 100, 200):
+        for density in (0.0, 0.1, 0.2, 0.3):
+            grid = make_grid(size, size, density, args.seed)
+            goal = (size - 1, size - 1)
+            path_len = len(astar((0, 0), goal, grid))
+            stats = measure(lambda: astar((0, 0), goal, grid), args.repeat, max(1, 2000 // (size * size)))
+            results.append({"name": "astar", "params": {"size": size, "density": density, "path_len": path_len}, **stats})
+    return results
+
+
+def bench_hpa(args):
+    from hpa import HierarchicalPlanner
+    results = []
+    for size in (50, 100, 200):
+        grid = make_grid(size, size, 0.2, args.seed)
+        goal = (size - 1, size - 1)
+        planner = HierarchicalPlanner(grid, cluster_size=10)
+        started = time.perf_counter()
+        path_len = len(planner((0, 0), goal, grid))
+        cold_us = (time.perf_counter() - started) * 1e6
+        stats = measure(lambda: planner((0, 0), goal, grid), args.repeat, 1)
+        results.append({"name": "hpa", "params": {"size": size, "density": 0.2, "path_len": path_len},
+                        "cold_us": cold_us, **stats})
+    return results
+
+
+def bench_movers(args):
+    results = []
+    for count in (4, 16, 64, 256):
+        sim_rng = SimulationRNG(args.seed)
+        rng = random.Random(args.seed)
+        grid = make_grid(50, 50, 0.1, args.seed)
+        pedestrians = PedestrianManager(sim_rng.stream("pedestrians"))
+        for pos in free_cells(grid, rng, count):
+            grid[pos[0]][pos[1]].set_type("pedestrian")
+            pedestrians.add_pedestrian(pos)
+        stats = measure(lambda: pedestrians.move_pedestrians(grid, (0, 0)), args.repeat, 20)
+        results.append({"name": "move_pedestrians", "params": {"count": count}, **stats})
+
+        grid = make_grid(50, 50, 0.1, args.seed)
+        garbage = Garbage(sim_rng.stream("garbage"))
+        for r, c in free_cells(grid, rng, count):
+            garbage.positions.append((r, c, "images/garbage.jpg"))
+            garbage.directions.append(garbage.rng.choice([(-1, 0), (1, 0), (0, -1), (0, 1)]))
+            grid[r][c].set_type("garbage")
+        stats = measure(lambda: garbage.move_garbage(grid, (0, 0)), args.repeat, 20)
+        results.append({"name": "move_garbage", "params": {"count": count}, **stats})
+    return results
+
+
+def bench_set_type(args):
+    results = []
+    cell = Cell(0, 0)
+    for kind in ("pedestrian", "building"):
+        def toggle():
+            cell.set_type(kind)
+            cell.set_type("empty")
+        stats = measure(toggle, args.repeat, 100)
+        results.append({"name": "set_type", "params": {"type": kind}, **stats})
+    return results
+
+
+def pedestrian_crop():
+    """Returns a CELL_SIZE x CELL_SIZE surface showing a pedestrian sprite."""
+    surface = pygame.Surface((CELL_SIZE, CELL_SIZE))
+    surface.fill((255, 255, 255))
+    img = pygame.transform.scale(pygame.image.load("images/yaya.png"), (CELL_SIZE, CELL_SIZE))
+    surface.blit(img, (0, 0))
+    return surface
+
+
+def bench_yolo(args):
+    from yolo import contains_human, contains_human_batch
+    crop = pedestrian_crop()
+    contains_human(crop)  # Warm-up: the first predict call initialises the model
+    results = [{"name": "contains_human", "params": {"batch": 1}, **measure(lambda: contains_human(crop), args.repeat, 5)}]
+    for batch in (3, 8, 16):
+        crops = [crop] * batch
+        stats = measure(lambda: contains_human_batch(crops), args.repeat, 2)
+        stats["per_crop_us"] = stats["median_us"] / batch
+        results.append({"name": "contains_human_batch", "params": {"batch": batch}, **stats})
+    return results
+
+
+def bench_detectors(args):
+    """
+    Latency of every detector backend on one rendered scene, and how often
+    each agrees with the full ultralytics model on "human or not".
+    """
+    import yolo
+    from perception_eval import render_scene
+    surface, grid, _ = render_scene(args.seed)
+    crops = [yolo.surface_to_numpy(surface.subsurface(c * CELL_SIZE, r * CELL_SIZE, CELL_SIZE, CELL_SIZE).copy())
+             for r in range(len(grid)) for c in range(len(grid[0]))]
+    labels = [cell.type == "pedestrian" for row in grid for cell in row]
+
+    detectors = {"ultralytics": yolo.UltralyticsDetector()}
+    for path in args.onnx or [DETECTOR_ONNX_PATH]:
+        if os.path.exists(path):
+            detectors[f"onnx:{path}"] = yolo.OnnxDetector(path)
+        else:
+            print(f"skipping {path}: not found (create it with `python yolo.py --int8`)", file=sys.stderr)
+
+    results = []
+    reference = None
+    for name, detector in detectors.items():
+        images = [yolo.preprocess(crop, detector.input_size) for crop in crops]
+        detector(images[:1])  # Warm-up
+        confidences = detector(images)
+        if reference is None:
+            reference = confidences
+        found = [bool(conf) for conf in confidences]
+        both = [(a, b) for a, b in zip(confidences, reference) if a and b]
+        quality = {
+            "agreement": sum(a == bool(b) for a, b in zip(found, reference)) / len(found),
+            "mean_conf_diff": statistics.fmean(abs(a - b) for a, b in both) if both else None,
+            "recall": sum(f and l for f, l in zip(found, labels)) / max(1, sum(labels)),
+        }
+        for batch in (1, 16, len(images)):
+            stats = measure(lambda: detector(images[:batch]), args.repeat, 1)
+            stats["per_crop_us"] = stats["median_us"] / batch
+            results.append({"name": "detector", "params": {"backend": name, "input_size": detector.input_size,
+                                                           "batch": batch}, **quality, **stats})
+    return results
+
+
+class SleepDetector:
+    """
+    Stand-in detector that takes a fixed time per call whatever the batch
+    size, so server batching can be measured without the model.
+    """
+    input_size = 160
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __call__(self, images, imgsz=None):
+        time.sleep(self.delay)
+        return [False] * len(images)
+
+
+def _inference_worker(address, crops, rounds, barrier):
+    from inference_server import InferenceClient
+    client = InferenceClient(address)
+    barrier.wait()  # Start timing only once every worker is connected
+    for _ in range(rounds):
+        client.detect(crops)
+    client.close()
+
+
+def bench_inference_server(args):
+    """
+    Aggregate detection throughput of 1..8 worker processes sharing one
+    inference server, each sending the three front cells of a vehicle per call.
+    With --detector-delay the server runs a SleepDetector instead of the
+    configured model.
+    """
+    import multiprocessing
+    import tempfile
+    import yolo
+    from inference_server import InferenceServer
+    crops = [yolo.surface_to_numpy(pedestrian_crop())] * 3
+    rounds = 10
+    address = os.path.join(tempfile.mkdtemp(), "inference.sock")
+    detector = SleepDetector(args.detector_delay / 1000) if args.detector_delay else None
+    server = InferenceServer(address, detector=detector)
+    server.start()
+    results = []
+    try:
+        for workers in (1, 2, 4, 8):
+            barrier = multiprocessing.Barrier(workers + 1)
+            processes = [multiprocessing.Process(target=_inference_worker, args=(address, crops, rounds, barrier))
+                         for _ in range(workers)]
+            for process in processes:
+                process.start()
+            barrier.wait()
+            batches = server.batches
+            started = time.perf_counter()
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - started
+            results.append({"name": "inference_server",
+                            "params": {"workers": workers, "detector_delay_ms": args.detector_delay},
+                            "crops_per_s": workers * rounds * len(crops) / elapsed,
+                            "detector_calls": server.batches - batches})
+    finally:
+        server.stop()
+    return results
+
+
+def bench_mapgen(args):
+    """
+    Time per map of inline generation and of MapPool.pop() taken back to
+    back, which is what decides mapgen.use_pool()'s threshold.
+    """
+    from mapgen import MapPool, generate_map
+    results = []
+    for size in (10, 50, 200):
+        rng = SimulationRNG(args.seed)
+        count = 100 if size < 200 else 10
+        stream = rng.fork("inline")
+        results.append({"name": "mapgen", "params": {"size": size, "pool": False},
+                        **measure(lambda: generate_map(stream, size, size), args.repeat, count)})
+        with MapPool(rng, size, size) as pool:
+            pool.pop()  # Start-up of the worker processes
+            results.append({"name": "mapgen", "params": {"size": size, "pool": True, "cpus": os.cpu_count()},
+                            **measure(pool.pop, args.repeat, count)})
+    return results
+
+
+def bench_environment(args):
+    from environment import HybridEnvironment
+    from mapgen import MapPool
+    env = HybridEnvironment(SimulationRNG(args.seed))
+    results = [{"name": "env_reset", "params": {"pool": False}, **measure(env.reset, args.repeat, 20)}]
+
+    rng = SimulationRNG(args.seed)
+    with MapPool(rng, ROWS, COLS) as pool:
+        pooled = HybridEnvironment(rng, pool=pool)
+        pooled.reset()
+        results.append({"name": "env_reset", "params": {"pool": True}, **measure(pooled.reset, args.repeat, 20)})
+
+    rng = random.Random(args.seed)
+    env.reset()
+
+    def step():
+        if env.done:
+            env.reset()
+        env.step(rng.randint(0, 3))
+    results.append({"name": "env_step", "params": {}, **measure(step, args.repeat, 100)})
+    return results
+
+
+def make_state(seed, vehicles=2):
+    """
+    Builds a ready-to-run GameState on a seeded map with `vehicles` vehicles,
+    alternating between the RL and the baseline policy.
+    """
+    from firstgrid import initialize_grid
+    from game_state import GameState
+    from vehicle import Vehicle
+
+    sim_rng = SimulationRNG(seed)
+    grid, building_positions = initialize_grid(ROWS, COLS, rng=sim_rng)
+    state = GameState(grid, building_positions, PedestrianManager(sim_rng.stream("pedestrians")),
+                      Garbage(sim_rng.stream("garbage")), sim_rng)
+    rng = random.Random(seed)
+    start, goal = free_cells(grid, rng, 2)
+    state.start = start
+    state.end_list.append(goal)
+    grid[start[0]][start[1]].set_type("start")
+    grid[goal[0]][goal[1]].set_type("goal")
+    for pos in free_cells(grid, rng, 4):
+        grid[pos[0]][pos[1]].set_type("pedestrian")
+        state.pedestrians.add_pedestrian(pos)
+
+    path = astar(start, goal, grid)
+    for index in range(vehicles):
+        img_type, policy = ("car", "rl") if index % 2 == 0 else ("car1", "normal")
+        state.fleet.add(Vehicle(start, list(path), initial_target=goal, img_type=img_type), policy)
+    state.start_simulation = True
+    state.start_time = time.time()
+    return state
+
+
+def bench_full_tick(args):
+    import simulation
+    screen = pygame.Surface((WIDTH, HEIGHT + 60))
+    results = []
+    for vehicles in (2, 16, 128):
+        state = make_state(args.seed, vehicles)
+
+        def tick():
+            screen.fill((255, 255, 255))
+            simulation.update(state, screen, record_path=None)
+        results.append({"name": "full_tick", "params": {"vehicles": vehicles}, **measure(tick, args.repeat, 10)})
+    return results
+
+
+BENCHMARKS = {
+    "astar": bench_astar,
+    "hpa": bench_hpa,
+    "movers": bench_movers,
+    "set_type": bench_set_type,
+    "yolo": bench_yolo,
+    "detectors": bench_detectors,
+    "inference_server": bench_inference_server,
+    "mapgen": bench_mapgen,
+    "environment": bench_environment,
+    "full_tick": bench_full_tick,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run (default: all)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed used for maps and agent placement")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per benchmark")
+    parser.add_argument("--onnx", nargs="+", help="ONNX models compared by the detectors benchmark")
+    parser.add_argument("--detector-delay", type=float,
+                        help="Milliseconds per call of a stand-in detector for the inference_server benchmark")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    pygame.init()
+    results = []
+    for name in args.only or BENCHMARKS:
+        print(f"running {name} ...", file=sys.stderr)
+        results.extend(BENCHMARKS[name](args))
+
+    report = {
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
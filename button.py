@@ -1,11 +1,11 @@
 import pygame
+from text_cache import render_text
 
 class Button:
     def __init__(self, x, y, w, h, text, callback):
         self.rect = pygame.Rect(x, y, w, h)
         self.text = text
         self.callback = callback
-        self.font = pygame.font.SysFont(None, 24)
 
     def draw(self, screen):
         color = (140, 164, 111)
@@ -13,7 +13,7 @@ class Button:
             color = (244, 96, 111)
         pygame.draw.rect(screen, color, self.rect)
         pygame.draw.rect(screen, (50, 50, 50), self.rect, 2)
-        txt = self.font.render(self.text, True, (0, 0, 0))
+        txt = render_text(self.text, 24, (0, 0, 0))
         text_rect = txt.get_rect(center=self.rect.center)
         screen.blit(txt, text_rect)
 
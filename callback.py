@@ -1,9 +1,9 @@
 # callbacks.py
 import random
 import time
-from astar import astar
 from vehicle import Vehicle
-from settings import ROWS, COLS
+from settings import ROWS, COLS, FLEET
+from mapgen import sample_cells
 
 
 def set_start_mode(state):
@@ -21,10 +21,32 @@ def set_pedestrian_mode(state):
     state.mode = "pedestrian"
 
 
+def spawn_fleet(state):
+    """
+    Creates the vehicles listed in settings.FLEET at the start point,
+    all heading for the first destination and then the rest of end_list.
+    """
+    state.fleet.clear()
+    if not state.start or not state.end_list:
+        return
+    initial_path = state.fleet.plan(state.start, state.end_list[0], state.grid)
+    fallback_queue = state.end_list[1:]
+    for img_type, policy in FLEET:
+        vehicle = Vehicle(state.start, list(initial_path), destination_queue=fallback_queue.copy(),
+                          initial_target=state.end_list[0], img_type=img_type)
+        state.fleet.add(vehicle, policy)
+
+
+def write_record_header(state):
+    """Append the map/run/version header (and the seed, if seeded) to record.txt."""
+    seed = f", seed {state.rng.seed}" if state.rng else ""
+    with open("record.txt", "a") as f:
+        f.write(f"Here we have map {state.i}, run {state.j}, version {state.k}{seed}\n")
+
+
 def clear_callback(state):
     """Clear start, goal, and pedestrians on the map."""
     state.k += 1
-    state.v_reached = [False, False]
 
     for row in state.grid:
         for cell in row:
@@ -33,8 +55,7 @@ def clear_callback(state):
 
     state.start = None
     state.end_list.clear()
-    state.vehicle = None
-    state.vehicle1 = None
+    state.fleet.clear()
     state.path.clear()
     state.pedestrians.reset_positions()
     state.start_simulation = False
@@ -44,35 +65,25 @@ def clear_callback(state):
 def restart_callback(state):
     """Reset vehicles and pedestrians and start the simulation."""
     state.j += 1
-    state.v_reached = [False, False]
 
-    with open("record.txt", "a") as f:
-        f.write(f"Here we have map {state.i}, run {state.j}, version {state.k}\n")
-
-    if state.start and len(state.end_list) >= 1:
-        initial_path = astar(state.start, state.end_list[0], state.grid)
-        fallback_queue = state.end_list[1:] if len(state.end_list) > 1 else []
-        state.vehicle = Vehicle(state.start, initial_path, destination_queue=fallback_queue,
-                                initial_target=state.end_list[0])
-        state.vehicle1 = Vehicle(state.start, initial_path, destination_queue=fallback_queue.copy(),
-                                 initial_target=state.end_list[0], img_type="car1")
-    else:
-        state.vehicle = None
-        state.vehicle1 = None
+    write_record_header(state)
+    spawn_fleet(state)
 
     state.pedestrians.reset_positions()
     state.garbage.reset_positions()
     state.start_simulation = True
+    state.start_time = time.time()
+    state.start_step = state.clock.step
     state.mode = None
 
 
 def set_start(state):
     """Start the simulation."""
-    with open("record.txt", "a") as f:
-        f.write(f"Here we have map {state.i}, run {state.j}, version {state.k}\n")
+    write_record_header(state)
     if state.vehicle:
         state.start_simulation = True
         state.start_time = time.time()
+        state.start_step = state.clock.step
 
 
 def rebuild(state):
@@ -81,6 +92,8 @@ def rebuild(state):
     state.j = 0
     state.k = 0
 
+    map_rng = state.rng.stream("map") if state.rng else random
+
     for row in state.grid:
         for cell in row:
             if cell.type in ["start", "goal", "pedestrian", "building"]:
@@ -88,21 +101,18 @@ def rebuild(state):
 
     state.start = None
     state.end_list.clear()
-    state.vehicle = None
-    state.vehicle1 = None
-    state.v_reached = [False, False]
+    state.fleet.clear()
     state.path.clear()
     state.pedestrians.reset_positions()
+    old_buildings = set(state.building_positions)
     state.building_positions.clear()
 
     # Place 8 random buildings
-    while len(state.building_positions) < 8:
-        pos = (random.randint(0, ROWS - 1), random.randint(0, COLS - 1))
-        if pos not in state.building_positions:
-            state.building_positions.add(pos)
+    state.building_positions.update(sample_cells(map_rng, ROWS, COLS, 8))
 
-    for (r, c) in state.building_positions:
+    for (r, c) in sorted(state.building_positions):
         state.grid[r][c].set_type("building")
+    state.fleet.invalidate_map(old_buildings | state.building_positions)
 
     state.start_simulation = False
     state.mode = None
@@ -0,0 +1,186 @@
+import heapq
+from settings import PREDICTION_THRESHOLD, PREDICTION_WEIGHT
+from prediction import occupancy_cost, predicted_conflict
+
+# Moves available in the space-time search; (0, 0) is waiting in place
+MOVES = [(-1, 0), (1, 0), (0, -1), (0, 1), (0, 0)]
+
+
+class ReservationTable:
+    """
+    Space-time reservations: which vehicle holds a cell at a given tick,
+    and which vehicle moves along an edge between two ticks.
+    Edge reservations stop two vehicles from swapping cells head-on.
+    """
+    def __init__(self):
+        self.cells = {}   # tick -> {pos: vehicle id}
+        self.edges = {}   # tick -> {(from, to): vehicle id}, move from tick to tick + 1
+        self.owned = {}   # vehicle id -> [(tick, pos or edge, is_edge)]
+
+    def is_free(self, pos, tick, vid):
+        holder = self.cells.get(tick, {}).get(pos)
+        return holder is None or holder == vid
+
+    def edge_free(self, a, b, tick, vid):
+        """True unless another vehicle moves b -> a during the same tick."""
+        holder = self.edges.get(tick, {}).get((b, a))
+        return holder is None or holder == vid
+
+    def reserve(self, vid, start, path, tick, shared=()):
+        """Reserves the cells of `path` (one per tick after `tick`) and its edges."""
+        owned = self.owned.setdefault(vid, [])
+        prev = start
+        for offset, pos in enumerate(path):
+            t = tick + offset
+            self.edges.setdefault(t, {})[(prev, pos)] = vid
+            owned.append((t, (prev, pos), True))
+            if pos not in shared:
+                self.cells.setdefault(t + 1, {})[pos] = vid
+                owned.append((t + 1, pos, False))
+            prev = pos
+
+    def release(self, vid):
+        """Drops every reservation held by the vehicle."""
+        for t, key, is_edge in self.owned.pop(vid, ()):
+            table = self.edges if is_edge else self.cells
+            bucket = table.get(t)
+            if bucket is not None and bucket.get(key) == vid:
+                del bucket[key]
+
+    def prune(self, tick):
+        """Forgets reservations for ticks that have already passed."""
+        for table in (self.cells, self.edges):
+            for t in [t for t in table if t < tick]:
+                del table[t]
+        for vid, owned in self.owned.items():
+            self.owned[vid] = [entry for entry in owned if entry[0] >= tick]
+
+    def clear(self):
+        self.cells.clear()
+        self.edges.clear()
+        self.owned.clear()
+
+
+def windowed_astar(start, goal, grid, table, tick, window, vid, distance, shared=(), cost_map=None):
+    """
+    Space-time A* (WHCA*) from start at `tick` towards goal.
+    Searches at most `window` ticks ahead, respecting the reservations of
+    other vehicles, and uses the true static-map distance to the goal as
+    heuristic beyond the window. `cost_map` (optional) adds an extra cost
+    for every tick spent on a cell, like astar(). Returns one cell per tick
+    (waits repeat the cell), ending at the goal or at the best cell on the
+    window edge.
+    """
+    rows, cols = len(grid), len(grid[0])
+    h0 = distance.get(start)
+    if h0 is None:
+        return []
+    if hasattr(cost_map, "tolist"):
+        cost_map = cost_map.tolist()
+
+    queue = [(h0, 0, 0, start)]
+    came_from = {(start, 0): None}
+    costs = {(start, 0): 0}
+    while queue:
+        _, cost, g, pos = heapq.heappop(queue)
+        if cost > costs[(pos, g)]:
+            continue  # A cheaper way to this cell at this tick was found later
+        if pos == goal or g == window:
+            break
+        for dr, dc in MOVES:
+            nxt = (pos[0] + dr, pos[1] + dc)
+            if not (0 <= nxt[0] < rows and 0 <= nxt[1] < cols):
+                continue
+            if grid[nxt[0]][nxt[1]].type == "building":
+                continue
+            h = distance.get(nxt)
+            if h is None:
+                continue
+            t = tick + g
+            if nxt not in shared and not table.is_free(nxt, t + 1, vid):
+                continue
+            if not table.edge_free(pos, nxt, t, vid):
+                continue
+            new_cost = cost + 1 if cost_map is None else cost + 1 + cost_map[nxt[0]][nxt[1]]
+            if new_cost >= costs.get((nxt, g + 1), float("inf")):
+                continue
+            costs[(nxt, g + 1)] = new_cost
+            came_from[(nxt, g + 1)] = (pos, g)
+            heapq.heappush(queue, (new_cost + h, new_cost, g + 1, nxt))
+    else:
+        return []
+
+    path = []
+    node = (pos, g)
+    while came_from[node] is not None:
+        path.append(node[0])
+        node = came_from[node]
+    path.reverse()
+    return path
+
+
+class CooperativePlanner:
+    """
+    Plans the fleet through a shared reservation table, one vehicle at a
+    time in fleet order. Each vehicle gets a `window`-tick segment; it is
+    replanned when half the segment is used, when the vehicle left its plan
+    (e.g. waited for a pedestrian or changed lane), its target changed or a
+    pedestrian is predicted on the segment. Predicted occupancy is a cost
+    of every replan, so vehicles route around pedestrians without leaving
+    their reservations. Start and target cells are shared, so vehicles may
+    stack on them.
+    """
+    def __init__(self, fleet, window=8):
+        self.fleet = fleet
+        self.window = window
+        self.table = ReservationTable()
+        self.segments = {}   # vehicle id -> (tick, target, [start] + planned cells)
+        self.shared = set()  # Cells several vehicles may hold at once
+
+    def reset(self):
+        self.table.clear()
+        self.segments.clear()
+        self.shared.clear()
+
+    def _needs_replan(self, vid, vehicle, tick):
+        segment = self.segments.get(vid)
+        if segment is None:
+            return True
+        t0, target, cells = segment
+        offset = tick - t0
+        if target != vehicle.current_target or offset >= len(cells) or cells[offset] != vehicle.pos:
+            return True
+        return offset >= self.window // 2 and cells[-1] != target
+
+    def replan(self, vid, vehicle, grid, tick, cost_map=None):
+        """Plans a new windowed segment for one vehicle and reserves it."""
+        self.table.release(vid)
+        target = vehicle.current_target
+        self.shared.add(target)
+        field = self.fleet.distance_field(target, grid)
+        path = windowed_astar(vehicle.pos, target, grid, self.table, tick, self.window,
+                              vid, field.dist, self.shared, cost_map)
+        if not path and vehicle.pos != target:
+            path = [vehicle.pos]  # Boxed in: wait one tick and try again
+        self.table.reserve(vid, vehicle.pos, path, tick, self.shared)
+        self.segments[vid] = (tick, target, [vehicle.pos] + path)
+        vehicle.path = path
+        vehicle.step = 0
+
+    def update(self, grid, tick, occupancy=None):
+        """
+        Replans, in priority order, every vehicle whose segment is stale.
+        `occupancy` is the predicted pedestrian occupancy, (horizon, rows, cols).
+        """
+        self.table.prune(tick)
+        cost_map = None if occupancy is None else occupancy_cost(occupancy, PREDICTION_WEIGHT)
+        for vid, vehicle in enumerate(self.fleet.vehicles):
+            if self.fleet.reached[vid]:
+                if vid in self.segments:
+                    self.table.release(vid)
+                    del self.segments[vid]
+                continue
+            if self._needs_replan(vid, vehicle, tick) or (
+                    occupancy is not None and predicted_conflict(vehicle.path, vehicle.step, occupancy,
+                                                                 PREDICTION_THRESHOLD)):
+                self.replan(vid, vehicle, grid, tick, cost_map)
@@ -0,0 +1,78 @@
+import numpy as np
+from settings import DIRECTIONS
+
+
+class CostMap:
+    """
+    Per-cell step costs for astar(cost_map=...), built from layers:
+    static (buildings are infinite) and dynamic (garbage and pedestrian
+    cells and the cells next to pedestrians are penalised). Predicted
+    pedestrian occupancy is not a layer: each vehicle passes its own
+    prediction cost to the planner. The dynamic layer is updated only around
+    cells whose garbage or pedestrian occupancy changed since the last tick.
+    """
+    def __init__(self, grid, garbage_cost=8.0, pedestrian_cost=6.0, adjacent_cost=2.0):
+        self.grid = grid           # Map the static layer is built from
+        self.rows, self.cols = len(grid), len(grid[0])
+        self.garbage_cost = garbage_cost
+        self.pedestrian_cost = pedestrian_cost
+        self.adjacent_cost = adjacent_cost
+        self.static = np.zeros((self.rows, self.cols))
+        self.dynamic = np.zeros((self.rows, self.cols))
+        self.garbage = set()       # Garbage cells at the last update
+        self.pedestrians = set()   # Pedestrian cells at the last update
+        self.static_dirty = True
+        self._total = None         # Cached sum of the layers
+
+    def invalidate_static(self):
+        """Marks the building layer for rebuilding; call whenever buildings change."""
+        self.static_dirty = True
+        self._total = None
+
+    def _refresh_static(self, grid):
+        self.grid = grid
+        self.static = np.array([[np.inf if cell.type == "building" else 0.0 for cell in row] for row in grid])
+        self.static_dirty = False
+
+    def _cell_cost(self, r, c):
+        if (r, c) in self.garbage:
+            return self.garbage_cost
+        if (r, c) in self.pedestrians:
+            return self.pedestrian_cost
+        for dr, dc in DIRECTIONS:
+            if (r + dr, c + dc) in self.pedestrians:
+                return self.adjacent_cost
+        return 0.0
+
+    def update(self, grid, garbage_positions, pedestrian_positions):
+        """
+        Brings the layers up to date with the current entity positions
+        (lists of (row, col, ...) tuples, as kept by the managers).
+        """
+        if self.static_dirty:
+            self._refresh_static(grid)
+            self._total = None
+
+        garbage = {(p[0], p[1]) for p in garbage_positions}
+        pedestrians = {(p[0], p[1]) for p in pedestrian_positions}
+        changed = (garbage ^ self.garbage) | (pedestrians ^ self.pedestrians)
+        if not changed:
+            return
+        self.garbage, self.pedestrians = garbage, pedestrians
+
+        affected = set(changed)
+        for r, c in changed:
+            affected.update((r + dr, c + dc) for dr, dc in DIRECTIONS)
+        for r, c in affected:
+            if 0 <= r < self.rows and 0 <= c < self.cols:
+                self.dynamic[r, c] = self._cell_cost(r, c)
+        self._total = None
+
+    def total(self):
+        """Returns the combined (rows, cols) cost array, rebuilding a stale building layer first."""
+        if self.static_dirty:
+            self._refresh_static(self.grid)
+            self._total = None
+        if self._total is None:
+            self._total = self.static + self.dynamic
+        return self._total
@@ -1,14 +1,21 @@
-import random
 from settings import ROWS, COLS
 from grid import Cell
 from pedestrian import PedestrianManager
 from vehicle import Vehicle
 from astar import astar
+from rng import SimulationRNG
+from mapgen import generate_map
+from state_encoder import encode_states, decode_state, occupancy_grid
 
 class HybridEnvironment:
-    def __init__(self):
+    def __init__(self, rng=None, planner=None, pool=None):
+        self.rng = rng or SimulationRNG()
+        self.planner = planner or astar  # astar or a HierarchicalPlanner for large maps
+        self.pool = pool                 # Optional MapPool; maps are generated inline without one
+        self.random = self.rng.stream("environment")  # Placement and exploration draws
         self.grid = None
-        self.pedestrian_manager = PedestrianManager()
+        self.map = None                  # MapSpec of the current episode
+        self.pedestrian_manager = PedestrianManager(self.rng.stream("pedestrians"))
         self.vehicle = None
         self.start = None
         self.end_list = []
@@ -18,14 +25,19 @@ class HybridEnvironment:
         self.current_step = 0
 
     def reset(self):
-        self.grid = [[Cell(r, c) for c in range(COLS)] for r in range(ROWS)]
-        self._place_random_buildings(8)
-        self._set_start_and_goals()
-        self._place_pedestrians(random.randint(3, 6))
-
-        if self.end_list:
-            path = astar(self.start, self.end_list[0], self.grid)
-            self.vehicle = Vehicle(self.start, path, self.end_list[1:])
+        spec = self.pool.pop() if self.pool else generate_map(self.random, ROWS, COLS)
+        if self.grid is None:
+            sprite_rng = self.rng.stream("sprites")
+            self.grid = [[Cell(r, c, rng=sprite_rng) for c in range(COLS)] for r in range(ROWS)]
+            if hasattr(self.planner, "bind"):
+                self.planner.bind(self.grid)
+        else:
+            self._clear_map()
+        self._apply_map(spec)
+
+        # Goals are drawn from the start's component, so this path is never empty
+        path = self.planner(self.start, self.end_list[0], self.grid)
+        self.vehicle = Vehicle(self.start, path, self.end_list[1:])
 
         self.done = False
         self.wait_counter = 0
@@ -36,19 +48,13 @@ class HybridEnvironment:
         reward = 0
         self.current_step += 1
 
+        # move_pedestrians keeps the "pedestrian" cell types in sync itself
         self.pedestrian_manager.move_pedestrians(self.grid, self.vehicle.pos)
 
-        for r in range(ROWS):
-            for c in range(COLS):
-                if (r, c) in self.pedestrian_manager.positions:
-                    self.grid[r][c].set_type("pedestrian")
-                elif self.grid[r][c].type == "pedestrian":
-                    self.grid[r][c].set_type("empty")
-
         moved = False
 
         if self.wait_counter >= 3 and action == 0:
-            action = random.choice([1, 2, 3])
+            action = self.random.choice([1, 2, 3])
 
         if action == 0:  # Wait
             self.wait_counter += 1
@@ -90,26 +96,10 @@ class HybridEnvironment:
         return self.get_state(), reward, self.done, {}
 
     def get_state(self):
-        r, c = self.vehicle.pos
-        dr, dc = self.get_direction()
-
-        if (dr, dc) == (0, 0):
-            dr, dc = (-1, 0)
-
-        front = [
-            (r + dr - dc, c + dc + dr),
-            (r + dr, c + dc),
-            (r + dr + dc, c + dc - dr)
-        ]
-
-        state = []
-        for (i, j) in front:
-            if 0 <= i < ROWS and 0 <= j < COLS and self.grid[i][j].type == "pedestrian":
-                state.append(1)
-            else:
-                state.append(0)
-
-        return tuple(state)  # (left, front, right)
+        # Same encoding as the live fleet (see state_encoder.py), from the pedestrian cells
+        humans = occupancy_grid(self.pedestrian_manager.positions, ROWS, COLS)
+        index = encode_states([self.vehicle.pos], [self.get_direction()], humans)[0]
+        return decode_state(index)  # (left, front, right)
 
     def get_direction(self):
         if self.vehicle and self.vehicle.step < len(self.vehicle.path):
@@ -140,7 +130,7 @@ class HybridEnvironment:
             self.vehicle.pos = new_pos
             if self.vehicle.destinations:
                 target = self.vehicle.destinations[0]
-                new_path = astar(self.vehicle.pos, target, self.grid)
+                new_path = self.planner(self.vehicle.pos, target, self.grid)
                 if new_path:
                     self.vehicle.path = new_path
                     self.vehicle.step = 0
@@ -151,36 +141,34 @@ class HybridEnvironment:
         r, c = pos
         return 0 <= r < ROWS and 0 <= c < COLS and self.grid[r][c].type not in ["pedestrian", "building"]
 
-    def _place_random_buildings(self, count):
-        added = 0
-        while added < count:
-            r, c = random.randint(0, ROWS - 1), random.randint(0, COLS - 1)
-            if self.grid[r][c].type == "empty":
-                self.grid[r][c].set_type("building")
-                added += 1
-
-    def _set_start_and_goals(self):
-        while True:
-            r, c = random.randint(0, ROWS - 1), random.randint(0, COLS - 1)
-            if self.grid[r][c].type == "empty":
-                self.start = (r, c)
-                self.grid[r][c].set_type("start")
-                break
-
-        self.end_list = []
-        while len(self.end_list) < random.randint(1, 3):
-            r, c = random.randint(0, ROWS - 1), random.randint(0, COLS - 1)
-            if self.grid[r][c].type == "empty" and (r, c) != self.start:
-                self.end_list.append((r, c))
-                self.grid[r][c].set_type("goal")
+    def _invalidate(self, cells):
+        # Lets a hierarchical planner rebuild only the clusters whose buildings changed
+        if cells and hasattr(self.planner, "invalidate"):
+            self.planner.invalidate(cells)
+
+    def _clear_map(self):
+        # Only the cells the previous map touched can be non-empty
+        old = self.map
+        cells = [old.start, *old.goals, *old.buildings]
+        cells.extend((p[0], p[1]) for p in self.pedestrian_manager.positions)
+        for r, c in cells:
+            self.grid[r][c].set_type("empty")
+        self._invalidate(old.buildings)
+
+    def _apply_map(self, spec):
+        self.map = spec
+        for r, c in spec.buildings:
+            self.grid[r][c].set_type("building")
+        self._invalidate(spec.buildings)
+
+        self.start = spec.start
+        self.grid[spec.start[0]][spec.start[1]].set_type("start")
+        self.end_list = list(spec.goals)
+        for r, c in spec.goals:
+            self.grid[r][c].set_type("goal")
 
-    def _place_pedestrians(self, count):
         self.pedestrian_manager.positions.clear()
         self.pedestrian_manager.directions.clear()
-        added = 0
-        while added < count:
-            r, c = random.randint(0, ROWS - 1), random.randint(0, COLS - 1)
-            if self.grid[r][c].type == "empty":
-                self.pedestrian_manager.add_pedestrian((r, c))
-                self.grid[r][c].set_type("pedestrian")
-                added += 1
+        for r, c in spec.pedestrians:
+            self.pedestrian_manager.add_pedestrian((r, c))
+            self.grid[r][c].set_type("pedestrian")
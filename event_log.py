@@ -0,0 +1,110 @@
+from collections import deque, namedtuple
+from state_encoder import decode_state
+
+# One vehicle event. Only the fields that apply to the kind are set; text is
+# produced by format_event() when the event is displayed, never when logged.
+Event = namedtuple("Event", ["tick", "kind", "cell", "confidence", "action", "value"])
+
+# Event kinds
+HUMAN = "human"                # Human detected in `cell` with `confidence`
+WAITED = "waited"              # Waited for a human, `value` ticks so far
+RL_DECISION = "rl_decision"    # RL agent chose `action` for state index `value`
+ACTION = "action"              # Applied RL `action`; `value` is True when right was blocked
+REPLANNED = "replanned"        # Replanned around predicted pedestrians
+NEW_PATH = "new_path"          # New path after a lane change
+REACHED = "reached"            # Reached the final target in `value` steps
+VEHICLE_AHEAD = "vehicle"      # Waiting for another vehicle in `cell`
+
+ACTION_NAMES = ["Wait", "Forward", "Right", "Left"]
+
+
+def format_event(event):
+    """Display text of an event, as shown in the information panel."""
+    kind = event.kind
+    if kind == HUMAN:
+        return f"--->Human detected: {event.cell[0]},{event.cell[1]} with confidence: {round(event.confidence, 2)}"
+    if kind == WAITED:
+        return f"--> waited for {event.value} ticks ."
+    if kind == RL_DECISION:
+        return f"--> RL agent for the state {decode_state(event.value)}  choose the action'{ACTION_NAMES[event.action]}'"
+    if kind == ACTION:
+        if event.action == 0:
+            return "--> Car is waiting"
+        if event.action == 1:
+            return "--> Car is trying to go forward"
+        if event.action == 2:
+            return "--> Right blocked by building, trying left" if event.value else "--> Car is trying to go right"
+        return "--> Car is trying to go left"
+    if kind == REPLANNED:
+        return "--> Replanned around predicted pedestrians."
+    if kind == NEW_PATH:
+        return "--> New path calculated."
+    if kind == REACHED:
+        return f"--> Reached the target in {event.value} steps"
+    if kind == VEHICLE_AHEAD:
+        return f"--> Waiting for vehicle at {event.cell[0]},{event.cell[1]}"
+    return f"--> {kind}"
+
+
+class EventLog:
+    """
+    Fixed-capacity ring buffer of one vehicle's events. Old events fall
+    off the front, so memory stays flat however long a run is. Every event
+    is also handed to `sink`, if set, e.g. an EventSink streaming to disk.
+    """
+    def __init__(self, capacity=100, sink=None, source=0):
+        self.events = deque(maxlen=capacity)
+        self.sink = sink        # Callable sink(source, event), or None
+        self.source = source    # Identifies the vehicle in the sink
+        self.tick = 0           # Simulation step stamped on new events, set by the fleet
+        self.version = 0        # Incremented on every change, for redraws
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def log(self, kind, cell=None, confidence=None, action=None, value=None):
+        event = Event(self.tick, kind, cell, confidence, action, value)
+        self.events.append(event)
+        self.version += 1
+        if self.sink:
+            self.sink(self.source, event)
+
+    def recent(self, count):
+        """The last `count` events, oldest first."""
+        start = max(0, len(self.events) - count)
+        return [self.events[i] for i in range(start, len(self.events))]
+
+    def lines(self, count=None):
+        """Formatted text of the last `count` events (all when None)."""
+        events = self.events if count is None else self.recent(count)
+        return [format_event(event) for event in events]
+
+    def restore(self, events):
+        """Replaces the buffered events, e.g. from a snapshot."""
+        self.events.clear()
+        self.events.extend(events)
+        self.version += 1
+
+
+class EventSink:
+    """
+    Streams events of any number of vehicles to a tab-separated file:
+    source, tick, kind, row, col, confidence, action, value. Fields are
+    written raw; format_event() can rebuild the display text later.
+    """
+    def __init__(self, path):
+        self.file = open(path, "w", buffering=1 << 16)
+        self.file.write("source\ttick\tkind\trow\tcol\tconfidence\taction\tvalue\n")
+
+    def __call__(self, source, event):
+        row, col = event.cell if event.cell else ("", "")
+        self.file.write(f"{source}\t{event.tick}\t{event.kind}\t{row}\t{col}\t"
+                        f"{'' if event.confidence is None else event.confidence}\t"
+                        f"{'' if event.action is None else event.action}\t"
+                        f"{'' if event.value is None else event.value}\n")
+
+    def close(self):
+        self.file.close()
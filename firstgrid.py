@@ -1,16 +1,21 @@
 import random
 from grid import Cell
+from mapgen import sample_cells
 
-def initialize_grid(rows, cols, num_buildings=8):
-    grid = [[Cell(r, c) for c in range(cols)] for r in range(rows)]
+def initialize_grid(rows, cols, num_buildings=8, rng=None):
+    """
+    Creates a rows x cols grid with `num_buildings` buildings, sampled
+    without replacement. Placement and sprites are drawn from the "map" and
+    "sprites" streams of the given SimulationRNG, or from the global random
+    module if none is given.
+    """
+    map_rng = rng.stream("map") if rng else random
+    sprite_rng = rng.stream("sprites") if rng else random
+    grid = [[Cell(r, c, rng=sprite_rng) for c in range(cols)] for r in range(rows)]
 
-    building_positions = set()
-    while len(building_positions) < num_buildings:
-        pos = (random.randint(0, rows - 1), random.randint(0, cols - 1))
-        if pos not in building_positions:
-            building_positions.add(pos)
+    building_positions = set(sample_cells(map_rng, rows, cols, num_buildings))
 
-    for (r, c) in building_positions:
+    for (r, c) in sorted(building_positions):
         grid[r][c].set_type("building")
 
     return grid, building_positions
@@ -0,0 +1,287 @@
+from collections import deque
+import numpy as np
+from settings import ROWS, COLS, CELL_SIZE
+from yolo import contains_human_batch
+from vehicle import Vehicle
+from profiler import profiler
+from cooperative import CooperativePlanner
+from astar import astar
+from hpa import HierarchicalPlanner
+from state_encoder import encode_states
+from inference_server import get_client
+import event_log
+
+# Policy name -> Vehicle method that moves the vehicle for one tick
+POLICIES = {
+    "rl": Vehicle.move,            # Waits for humans, then asks the Q-table
+    "normal": Vehicle.move_normal, # Baseline: only waits for humans
+}
+
+
+class DistanceField:
+    """
+    Breadth-first distances from one goal to every reachable cell of the
+    static map (buildings blocked). Shared by all vehicles heading to that
+    goal, so each replan is a walk down the field instead of a new search.
+    """
+    def __init__(self, goal, grid):
+        self.goal = goal
+        rows, cols = len(grid), len(grid[0])
+        self.dist = {goal: 0}
+        queue = deque([goal])
+        while queue:
+            r, c = queue.popleft()
+            d = self.dist[(r, c)] + 1
+            for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                nr, nc = r + dr, c + dc
+                if (0 <= nr < rows and 0 <= nc < cols and (nr, nc) not in self.dist
+                        and grid[nr][nc].type != "building"):
+                    self.dist[(nr, nc)] = d
+                    queue.append((nr, nc))
+
+    def path_from(self, start):
+        """
+        Returns a shortest path from start to the goal (start excluded),
+        or [] when the goal is unreachable, like astar().
+        """
+        if start == self.goal or start not in self.dist:
+            return []
+        path = []
+        r, c = start
+        while (r, c) != self.goal:
+            d = self.dist[(r, c)]
+            for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                if self.dist.get((r + dr, c + dc)) == d - 1:
+                    r, c = r + dr, c + dc
+                    break
+            path.append((r, c))
+        return path
+
+
+class Fleet:
+    """
+    Holds any number of vehicles, each driven by its own policy.
+    Keeps a spatial hash of vehicle positions for O(1) conflict checks,
+    shares static-map distance fields between vehicles and runs YOLO for
+    the whole fleet in one batch per tick. With `cooperative` set, paths
+    are planned through a shared space-time reservation table.
+    """
+    def __init__(self, avoid_collisions=False, cooperative=False, window=8, cost_map=None,
+                 hierarchical=False, cluster_size=10, event_sink=None):
+        self.vehicles = []
+        self.policies = []          # Policy name per vehicle, see POLICIES
+        self.reached = []           # Whether each vehicle reached the final target
+        self.reach_steps = []       # Steps each vehicle needed, None until it arrives
+        self.cells = {}             # Spatial hash: position -> set of vehicle indices
+        self.distance_fields = {}   # goal -> DistanceField on the current map
+        self.avoid_collisions = avoid_collisions  # Wait instead of entering a cell holding another vehicle
+        self.cooperative = CooperativePlanner(self, window) if cooperative else None
+        self.cost_map = cost_map    # Optional CostMap; when set, replans weigh garbage and pedestrians
+        self.hierarchical = hierarchical  # Plan with HPA* instead of per-goal distance fields (large maps)
+        self.cluster_size = cluster_size
+        self.hpa = None             # HierarchicalPlanner, created on the first hierarchical query
+        self.last_detections = None # YOLO results of the last tick, {(r, c): confidence}, for traces
+        self.event_sink = event_sink  # Optional EventSink receiving the events of every vehicle
+
+    def __len__(self):
+        return len(self.vehicles)
+
+    def __iter__(self):
+        return iter(self.vehicles)
+
+    def __getitem__(self, index):
+        return self.vehicles[index]
+
+    def add(self, vehicle, policy="rl"):
+        """Adds a vehicle driven by the named policy and returns its index."""
+        index = len(self.vehicles)
+        vehicle.planner = self.plan
+        vehicle.events.sink = self.event_sink
+        vehicle.events.source = index
+        self.vehicles.append(vehicle)
+        self.policies.append(policy)
+        self.reached.append(False)
+        self.reach_steps.append(None)
+        self.cells.setdefault(vehicle.pos, set()).add(index)
+        if self.cooperative:
+            self.cooperative.shared.add(vehicle.pos)
+        return index
+
+    def clear(self):
+        """Removes every vehicle."""
+        self.vehicles.clear()
+        self.policies.clear()
+        self.reached.clear()
+        self.reach_steps.clear()
+        self.cells.clear()
+        self.last_detections = None
+        if self.cooperative:
+            self.cooperative.reset()
+
+    def occupied(self, pos, exclude=None):
+        """Returns True if a vehicle other than `exclude` stands on pos."""
+        holders = self.cells.get(pos)
+        if not holders:
+            return False
+        return len(holders) > 1 or exclude not in holders
+
+    def positions(self):
+        """Cells currently holding at least one vehicle."""
+        return self.cells.keys()
+
+    def _relocate(self, index, old_pos, new_pos):
+        if old_pos == new_pos:
+            return
+        holders = self.cells[old_pos]
+        holders.discard(index)
+        if not holders:
+            del self.cells[old_pos]
+        self.cells.setdefault(new_pos, set()).add(index)
+
+    def invalidate_map(self, cells=None):
+        """
+        Drops cached map data; call whenever buildings change.
+        `cells` lists the changed cells so HPA* only rebuilds those clusters.
+        """
+        self.distance_fields.clear()
+        if self.hpa:
+            if cells is None:
+                self.hpa.bind(self.hpa.grid)
+            else:
+                self.hpa.invalidate(cells)
+        if self.cost_map:
+            self.cost_map.invalidate_static()
+
+    def distance_field(self, goal, grid):
+        """Returns the cached DistanceField towards goal, building it if needed."""
+        field = self.distance_fields.get(goal)
+        if field is None:
+            field = self.distance_fields[goal] = DistanceField(goal, grid)
+        return field
+
+    def plan(self, start, goal, grid, cost_map=None):
+        """
+        Planner shared by the fleet vehicles, same contract as astar().
+        Precedence: weighted A* over the fleet cost map (plus the extra
+        `cost_map`, if given) when there is either, otherwise HPA* when
+        `hierarchical` is set, otherwise the shared static distance field.
+        """
+        costs = self.cost_map.total() if self.cost_map else None
+        if cost_map is not None:
+            costs = cost_map if costs is None else costs + cost_map
+        if costs is None:
+            if self.hierarchical:
+                if self.hpa is None:
+                    self.hpa = HierarchicalPlanner(grid, self.cluster_size)
+                return self.hpa(start, goal, grid)
+            return self.distance_field(goal, grid).path_from(start)
+        return astar(start, goal, grid, costs)
+
+    def prefetch_detections(self, screen):
+        """
+        Runs YOLO once, in a single batch, on every cell in front of any
+        moving vehicle and hands the results to the vehicles for this tick.
+        """
+        cells = set()
+        for index, vehicle in enumerate(self.vehicles):
+            if not self.reached[index]:
+                cells.update((r, c) for r, c in vehicle.get_front_cells() if 0 <= r < ROWS and 0 <= c < COLS)
+        cells = sorted(cells)
+        crops = [screen.subsurface(c * CELL_SIZE, r * CELL_SIZE, CELL_SIZE, CELL_SIZE).copy() for r, c in cells]
+        with profiler.phase("yolo"):
+            detections = dict(zip(cells, contains_human_batch(crops)))
+        for vehicle in self.vehicles:
+            vehicle.detections = detections
+        self.last_detections = detections
+
+    def encode_rl_states(self, detections):
+        """
+        Encodes the RL state of every moving RL vehicle in one vectorized
+        pass over this tick's detections, so get_rl_state() needs no
+        per-cell lookups. Vehicles whose state cells were not all detected
+        this tick (no or diagonal heading, see get_front_cells) are left to
+        the per-cell path. With an inference server, the best actions of
+        the vehicles about to consult the agent are fetched in one request.
+        """
+        vehicles = []
+        for index, vehicle in enumerate(self.vehicles):
+            vehicle.encoded_state = vehicle.encoded_action = None
+            if self.policies[index] == "rl" and not self.reached[index] and vehicle.step < len(vehicle.path):
+                vehicles.append(vehicle)
+        if not vehicles:
+            return
+        humans = np.zeros((ROWS, COLS), dtype=np.uint8)
+        unknown = np.ones((ROWS, COLS), dtype=np.uint8)
+        for (r, c), confidence in detections.items():
+            unknown[r, c] = 0
+            if confidence:
+                humans[r, c] = 1
+        positions = [vehicle.pos for vehicle in vehicles]
+        next_cells = [vehicle.path[vehicle.step] for vehicle in vehicles]
+        headings = np.subtract(next_cells, positions)
+        # Encoding the undetected cells picks out vehicles with a state cell missing
+        # from the detections; cells off the map read as free either way
+        missing = encode_states(positions, headings, unknown)
+        states = encode_states(positions, headings, humans)
+        for vehicle, next_cell, index, gaps in zip(vehicles, next_cells, states, missing):
+            if not gaps:
+                vehicle.encoded_state = (vehicle.pos, next_cell, int(index))
+
+        client = get_client()
+        if client:
+            # Vehicle.move asks the agent once a vehicle has waited 3 ticks
+            asking = [vehicle for vehicle in vehicles if vehicle.encoded_state and vehicle.wait_counter >= 2]
+            if asking:
+                indices = [vehicle.encoded_state[2] for vehicle in asking]
+                for vehicle, index, action in zip(asking, indices, client.best_actions(indices)):
+                    vehicle.encoded_action = (index, action)
+
+    def update(self, screen, grid, tick=0, occupancy=None):
+        """
+        Moves every vehicle that has not arrived yet by one tick.
+        `occupancy` is the predicted pedestrian occupancy shared by all vehicles.
+        In a cooperative fleet it is handled by the reservation planner, so
+        vehicles never replan around it on their own.
+        """
+        if self.cooperative:
+            with profiler.phase("astar"):
+                self.cooperative.update(grid, tick, occupancy)
+            occupancy = None
+        self.prefetch_detections(screen)
+        with profiler.phase("rl_state"):
+            self.encode_rl_states(self.last_detections)
+        for vehicle in self.vehicles:
+            vehicle.events.tick = tick
+            vehicle.occupancy = occupancy
+            vehicle.last_state = vehicle.last_action = None
+        for index, vehicle in enumerate(self.vehicles):
+            if self.reached[index]:
+                continue
+            if self.avoid_collisions:
+                next_pos = vehicle.get_next_position()
+                if next_pos and next_pos != vehicle.current_target and self.occupied(next_pos, exclude=index):
+                    vehicle.events.log(event_log.VEHICLE_AHEAD, cell=next_pos)
+                    continue
+            old_pos = vehicle.pos
+            POLICIES[self.policies[index]](vehicle, screen, grid)
+            self._relocate(index, old_pos, vehicle.pos)
+        for vehicle in self.vehicles:
+            vehicle.detections = None
+
+    def record_arrivals(self, target, steps):
+        """Marks vehicles standing on target as arrived; returns their indices."""
+        arrived = []
+        for index in self.cells.get(target, ()):
+            if not self.reached[index]:
+                self.reached[index] = True
+                self.reach_steps[index] = steps
+                arrived.append(index)
+        return sorted(arrived)
+
+    def all_reached(self):
+        return bool(self.vehicles) and all(self.reached)
+
+    def draw(self, surface):
+        """Draws all vehicles; only the first one shows its information panel."""
+        for index, vehicle in enumerate(self.vehicles):
+            vehicle.draw(surface, index == 0)
@@ -1,3 +1,8 @@
+from sim_clock import SimulationClock
+from fleet import Fleet
+from costmap import CostMap
+from event_log import EventSink
+from settings import FLEET_AVOID_COLLISIONS, FLEET_COOPERATIVE, FLEET_WINDOW, COST_MAP, HPA, HPA_CLUSTER_SIZE, EVENT_LOG_PATH
 
 
 class GameState:
@@ -5,7 +10,10 @@ class GameState:
     A class that consolidates all variables used during the game in one place.
     Eliminates the need for global variables.
     """
-    def __init__(self, grid, building_positions, pedestrians, garbage):
+    def __init__(self, grid, building_positions, pedestrians, garbage, rng=None, clock=None):
+        # Seeded randomness shared by map building and the object managers
+        self.rng = rng
+
         # Map and position data
         self.grid = grid
         self.building_positions = building_positions
@@ -13,8 +21,10 @@ class GameState:
         # Vehicle and target information
         self.start = None
         self.end_list = []         # There can be multiple targets
-        self.vehicle = None
-        self.vehicle1 = None
+        self.fleet = Fleet(avoid_collisions=FLEET_AVOID_COLLISIONS, cooperative=FLEET_COOPERATIVE, window=FLEET_WINDOW,
+                           cost_map=CostMap(grid) if COST_MAP else None,
+                           hierarchical=HPA, cluster_size=HPA_CLUSTER_SIZE,
+                           event_sink=EventSink(EVENT_LOG_PATH) if EVENT_LOG_PATH else None)
         self.path = []
 
         # Object managers
@@ -25,15 +35,25 @@ class GameState:
         self.mode = None           # "start", "end", "pedestrian", etc.
         self.start_simulation = False
 
-        # Timing information
+        # Timing information (wall clock, kept for reference)
         self.start_time = None
-        self.end_time_v1 = None
-        self.end_time_v2 = None
 
-        # Information about whether vehicles have reached the target
-        self.v_reached = [False, False]
+        # Simulation time: outcomes are measured in steps, not seconds.
+        # Per-vehicle arrival steps live in fleet.reach_steps.
+        self.clock = clock or SimulationClock()
+        self.start_step = 0
 
         # Counters (map/run/version)
         self.i = 0  # Map counter
         self.j = 0  # Run counter
         self.k = 0  # Version counter
+
+    @property
+    def vehicle(self):
+        """The first vehicle of the fleet (the one with the information panel)."""
+        return self.fleet[0] if len(self.fleet) > 0 else None
+
+    @property
+    def vehicle1(self):
+        """The second vehicle of the fleet."""
+        return self.fleet[1] if len(self.fleet) > 1 else None
@@ -3,47 +3,50 @@ import pygame
 from settings import ROWS, COLS, DIRECTIONS, CELL_SIZE
 
 class Garbage:
-    def __init__(self):
+    def __init__(self, rng=None):
+        self.rng = rng or random  # Random stream for sprites and direction changes
         self.positions = []
         self.initial_positions = []
         self.directions = []
 
     def add_garbage(self):
         while len(self.positions) < 4:
-            pos = (random.randint(0, ROWS - 1), random.randint(0, COLS - 1))
+            pos = (self.rng.randint(0, ROWS - 1), self.rng.randint(0, COLS - 1))
             if pos not in self.positions:
-                image_path = random.choice([
+                image_path = self.rng.choice([
                     "images/garbage.jpg","images/garbage2.gif"
                 ])
                 self.positions.append((pos[0], pos[1], image_path))
                 self.initial_positions.append((pos[0], pos[1], image_path))
-                self.directions.append(random.choice(DIRECTIONS))
+                self.directions.append(self.rng.choice(DIRECTIONS))
 
     def reset_positions(self):
         self.positions = self.initial_positions.copy()
-        self.directions = [random.choice(DIRECTIONS) for _ in self.positions]
+        self.directions = [self.rng.choice(DIRECTIONS) for _ in self.positions]
 
-    def move_garbage(self, grid_matrix, car_pos):
+    def move_garbage(self, grid_matrix, car_pos, blocked=()):
         new_positions = []
         new_directions = []
 
         occupied_positions = {(p[0], p[1]) for p in self.positions}
         occupied_positions.add(car_pos)
+        occupied_positions.update(blocked)  # e.g. cells of the other vehicles
+        rows, cols = len(grid_matrix), len(grid_matrix[0])
 
         for idx, (r, c, img_path) in enumerate(self.positions):
             grid_matrix[r][c].set_type("empty")
 
             dr, dc = self.directions[idx]
 
-            if random.random() > 0.8:
+            if self.rng.random() > 0.8:
 
-                mr, mc = random.choice(DIRECTIONS)
+                mr, mc = self.rng.choice(DIRECTIONS)
                 if mr!=-dr and mc!=dc:
                     dr,dc = mr,mc
 
             nr, nc = r + dr, c + dc
 
-            if (0 <= nr < ROWS and 0 <= nc < COLS and
+            if (0 <= nr < rows and 0 <= nc < cols and
                 grid_matrix[nr][nc].type == "empty" and
                 (nr, nc) not in occupied_positions):
 
@@ -2,16 +2,22 @@ import pygame
 import random
 from settings import CELL_SIZE
 
+# Scaled sprites by path. Surfaces are only ever blitted, never modified,
+# so every cell showing the same sprite shares one surface and set_type()
+# does not read the image file again.
+_IMAGES = {}
+
 class Cell:
     """
     Represents a single cell in the grid.
     Each cell has a row and column index, a type (e.g., empty, car, building),
     and optionally an associated image for rendering.
     """
-    def __init__(self, row, col, cell_type="empty"):
+    def __init__(self, row, col, cell_type="empty", rng=None):
         self.row = row                  # Row index in the grid
         self.col = col                  # Column index in the grid
         self.type = cell_type           # Cell type: "empty", "car", "building", etc.
+        self.rng = rng or random        # Random stream used to pick sprites
         # Load image only if the cell type has a visual representation
         self.image = self.load_image() if self.should_have_image() else None
 
@@ -39,20 +45,24 @@ class Cell:
             ],
         }
 
-        image_path = random.choice(path_map.get(self.type, []))
+        image_path = self.rng.choice(path_map.get(self.type, []))
 
         if not image_path:
             return None
 
+        if image_path in _IMAGES:
+            return _IMAGES[image_path]
+
         try:
             img = pygame.image.load(image_path)
-            return pygame.transform.scale(img, (CELL_SIZE, CELL_SIZE))
+            img = pygame.transform.scale(img, (CELL_SIZE, CELL_SIZE))
         except Exception as e:
             print(f"Image couldn't load {image_path}, Error: {e}")
             # Return a simple gray surface as a fallback
-            surf = pygame.Surface((CELL_SIZE, CELL_SIZE))
-            surf.fill((200, 200, 200))
-            return surf
+            img = pygame.Surface((CELL_SIZE, CELL_SIZE))
+            img.fill((200, 200, 200))
+        _IMAGES[image_path] = img
+        return img
 
     def set_type(self, new_type):
         """
@@ -0,0 +1,197 @@
+import heapq
+from collections import deque
+from astar import astar, heuristic
+
+NEIGHBOURS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+
+class HierarchicalPlanner:
+    """
+    HPA* planner for large maps.
+    The grid is split into square clusters. Cells where two clusters touch
+    through free cells become entrances, and distances between the entrances
+    of one cluster are computed inside that cluster only. A query searches
+    this small abstract graph and then refines only the clusters on the
+    route. Everything is built lazily per cluster, and building edits
+    invalidate only the clusters they touch.
+    Same call contract as astar(): planner(start, goal, grid) -> path.
+    """
+    def __init__(self, grid, cluster_size=10):
+        self.cluster_size = cluster_size
+        self.bind(grid)
+
+    def bind(self, grid):
+        """Attaches the planner to a (new) grid and drops all cached data."""
+        self.grid = grid
+        self.rows, self.cols = len(grid), len(grid[0])
+        self.borders = {}   # (cluster, cluster) -> [(cell, cell)] transitions across that border
+        self.partners = {}  # entrance cell -> set of entrance cells across a border
+        self.intra = {}     # cluster -> {entrance: {entrance: distance inside the cluster}}
+
+    def _free(self, r, c):
+        return self.grid[r][c].type != "building"
+
+    def cluster_of(self, pos):
+        return (pos[0] // self.cluster_size, pos[1] // self.cluster_size)
+
+    def _neighbour_clusters(self, cluster):
+        cr, cc = cluster
+        for dr, dc in NEIGHBOURS:
+            nr, nc = cr + dr, cc + dc
+            if 0 <= nr * self.cluster_size < self.rows and 0 <= nc * self.cluster_size < self.cols:
+                yield (nr, nc)
+
+    def _border(self, a, b):
+        """Returns the transitions between two adjacent clusters, scanning the border once."""
+        key = (a, b) if a < b else (b, a)
+        if key in self.borders:
+            return self.borders[key]
+        a, b = key
+        size = self.cluster_size
+        if b[0] == a[0]:   # b is right of a: border between two columns
+            col = b[1] * size
+            pairs = [((r, col - 1), (r, col)) for r in range(a[0] * size, min((a[0] + 1) * size, self.rows))]
+        else:              # b is below a: border between two rows
+            row = b[0] * size
+            pairs = [((row - 1, c), (row, c)) for c in range(a[1] * size, min((a[1] + 1) * size, self.cols))]
+
+        transitions = []
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and self._free(*pair[0]) and self._free(*pair[1]):
+                run.append(pair)
+                continue
+            if run:
+                # Short openings get one entrance in the middle, long ones one at each end
+                transitions.extend([run[len(run) // 2]] if len(run) <= 5 else [run[0], run[-1]])
+                run = []
+
+        for x, y in transitions:
+            self.partners.setdefault(x, set()).add(y)
+            self.partners.setdefault(y, set()).add(x)
+        self.borders[key] = transitions
+        return transitions
+
+    def _entrances(self, cluster):
+        cells = set()
+        for other in self._neighbour_clusters(cluster):
+            for x, y in self._border(cluster, other):
+                cells.add(x if self.cluster_of(x) == cluster else y)
+        return cells
+
+    def _bfs(self, source, cluster):
+        """
+        Breadth-first search from source restricted to one cluster.
+        Returns (parents, distances) for every reachable cell of the cluster.
+        """
+        size = self.cluster_size
+        r0, c0 = cluster[0] * size, cluster[1] * size
+        r1, c1 = min(r0 + size, self.rows), min(c0 + size, self.cols)
+        grid = self.grid
+        parents = {source: None}
+        distances = {source: 0}
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            r, c = cell
+            d = distances[cell] + 1
+            for dr, dc in NEIGHBOURS:
+                nr, nc = r + dr, c + dc
+                if r0 <= nr < r1 and c0 <= nc < c1 and (nr, nc) not in parents and grid[nr][nc].type != "building":
+                    parents[(nr, nc)] = cell
+                    distances[(nr, nc)] = d
+                    queue.append((nr, nc))
+        return parents, distances
+
+    def _distances(self, source, cluster, targets):
+        """Distances inside the cluster from source to each reachable target."""
+        distances = self._bfs(source, cluster)[1]
+        return {t: distances[t] for t in targets if t in distances and t != source}
+
+    def _intra_edges(self, cluster):
+        edges = self.intra.get(cluster)
+        if edges is None:
+            entrances = self._entrances(cluster)
+            edges = {e: self._distances(e, cluster, entrances) for e in entrances}
+            self.intra[cluster] = edges
+        return edges
+
+    def invalidate(self, cells):
+        """Forgets the clusters containing the given cells (and their borders)."""
+        for cluster in {self.cluster_of(cell) for cell in cells}:
+            self.intra.pop(cluster, None)
+            for other in self._neighbour_clusters(cluster):
+                key = (cluster, other) if cluster < other else (other, cluster)
+                for x, y in self.borders.pop(key, ()):
+                    for u, v in ((x, y), (y, x)):
+                        linked = self.partners.get(u)
+                        if linked is not None:
+                            linked.discard(v)
+                            if not linked:
+                                del self.partners[u]
+                # The neighbour's entrances on this border change as well
+                self.intra.pop(other, None)
+
+    def _refine(self, a, b):
+        """Concrete cells from a to b (a excluded) for one abstract edge."""
+        if b in self.partners.get(a, ()):
+            return [b]
+        parents = self._bfs(a, self.cluster_of(a))[0]
+        segment = []
+        node = b
+        while node != a:
+            segment.append(node)
+            node = parents[node]
+        segment.reverse()
+        return segment
+
+    def __call__(self, start, goal, grid=None, cost_map=None):
+        if grid is not None and grid is not self.grid:
+            self.bind(grid)
+        if cost_map is not None:
+            return astar(start, goal, self.grid, cost_map)  # Weighted queries need the full grid
+        if start == goal or not self._free(*goal):
+            return []
+
+        start_cluster, goal_cluster = self.cluster_of(start), self.cluster_of(goal)
+        # Temporary edges connecting start and goal to the entrances of their clusters
+        start_edges = self._distances(start, start_cluster, self._entrances(start_cluster) | {goal})
+        goal_edges = self._distances(goal, goal_cluster, self._entrances(goal_cluster))
+
+        queue = [(heuristic(start, goal), 0, start)]
+        came_from = {start: None}
+        cost_so_far = {start: 0}
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == goal:
+                break
+            if cost > cost_so_far[node]:
+                continue
+            if node == start:
+                edges = dict(start_edges)
+            else:
+                edges = dict(self._intra_edges(self.cluster_of(node)).get(node, {}))
+                if node in goal_edges:
+                    edges[goal] = goal_edges[node]
+            for partner in self.partners.get(node, ()):
+                edges[partner] = 1
+            for nxt, step in edges.items():
+                new_cost = cost + step
+                if nxt not in cost_so_far or new_cost < cost_so_far[nxt]:
+                    cost_so_far[nxt] = new_cost
+                    came_from[nxt] = node
+                    heapq.heappush(queue, (new_cost + heuristic(nxt, goal), new_cost, nxt))
+        else:
+            return []
+
+        route = []
+        node = goal
+        while node is not None:
+            route.append(node)
+            node = came_from[node]
+        route.reverse()
+
+        path = []
+        for a, b in zip(route, route[1:]):
+            path.extend(self._refine(a, b))
+        return path
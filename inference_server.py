@@ -0,0 +1,356 @@
+"""
+Local inference service shared by many simulation processes.
+
+One server process holds the detector and the Q-table. Simulation workers
+connect over a Unix socket and send detection and policy requests; the
+server coalesces every request queued while it was busy with the previous
+batch (up to `max_batch` crops) into a single detector call and a single
+Q-table lookup, so batches grow with the load and a lone request is
+answered at once. Workers never load the model or the table.
+
+    python inference_server.py --socket /tmp/av-inference.sock
+
+and set settings.INFERENCE_SERVER to the same path in every worker:
+yolo.contains_human / contains_human_batch and Vehicle.get_best_action
+then go through InferenceClient transparently.
+"""
+import argparse
+import os
+import pickle
+import queue
+import socket
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+import numpy as np
+
+DETECT = "detect"   # Payload: list of RGB crops (uint8 arrays); result: confidence or False per crop
+ACTION = "action"   # Payload: list of state indices; result: best action per index
+
+
+def _shutdown(conn):
+    """
+    Closes a connection that another thread may be blocked reading: a plain
+    close() leaves that recv() waiting, shutting the socket down ends it.
+    """
+    try:
+        sock = socket.fromfd(conn.fileno(), socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.shutdown(socket.SHUT_RDWR)
+        sock.close()
+    except OSError:
+        pass  # Already closed
+
+
+class _Request:
+    __slots__ = ("conn", "lock", "request_id", "kind", "payload", "arrived")
+
+    def __init__(self, conn, lock, request_id, kind, payload):
+        self.conn = conn
+        self.lock = lock
+        self.request_id = request_id
+        self.kind = kind
+        self.payload = payload
+        self.arrived = time.perf_counter()
+
+
+class InferenceServer:
+    """
+    Serves detection and policy requests from any number of clients.
+    A reader thread per connection queues requests; one batcher thread
+    drains the queue in micro-batches and answers every request in it.
+    """
+    def __init__(self, address, q_table_path="off.pkl", max_batch=64, max_delay=0.0, detector=None):
+        self.address = address
+        self.max_batch = max_batch      # Most crops passed to the detector at once
+        self.max_delay = max_delay      # Extra wait for others to join a batch; 0 dispatches what is queued
+        self.detector = detector        # Callable(images) like yolo's backends; the configured one if None
+        with open(q_table_path, "rb") as f:
+            self.q_table = np.asarray(pickle.load(f))
+        self.requests = queue.Queue()
+        self.connections = set()        # Accepted client connections, closed by stop()
+        self.connections_lock = threading.Lock()
+        self.listener = None
+        self.running = False
+        self.batches = 0                # Detector calls made so far
+        self.crops = 0                  # Crops detected so far
+
+    def serve_forever(self):
+        """Accepts clients until stop() is called."""
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # Stale socket of a previous server
+        if self.detector is None:
+            import yolo
+            self.detector = yolo.get_detector()  # Load the model before the first client waits on it
+        self.listener = Listener(self.address, family="AF_UNIX")
+        self.running = True
+        threading.Thread(target=self._batch_loop, name="inference-batcher", daemon=True).start()
+        try:
+            while self.running:
+                try:
+                    conn = self.listener.accept()
+                except OSError:
+                    break  # Listener closed by stop()
+                if not self.running:
+                    conn.close()  # The wake-up connection made by stop()
+                    break
+                with self.connections_lock:
+                    self.connections.add(conn)
+                threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+        finally:
+            self.stop()
+
+    def start(self):
+        """Runs serve_forever() on a background thread and returns once clients can connect."""
+        thread = threading.Thread(target=self.serve_forever, name="inference-server", daemon=True)
+        thread.start()
+        while not self.running:
+            time.sleep(0.001)
+        return thread
+
+    def stop(self):
+        """
+        Stops accepting clients, fails the requests still queued and closes
+        every client connection, so waiting clients get an error instead
+        of blocking forever.
+        """
+        if not self.running:
+            return
+        self.running = False
+        self.requests.put(None)  # Wakes the batcher
+        if self.listener:
+            try:
+                Client(self.address, family="AF_UNIX").close()  # Wakes a blocked accept()
+            except OSError:
+                pass
+            self.listener.close()
+        self._fail_pending("inference server stopped")
+        with self.connections_lock:
+            connections, self.connections = self.connections, set()
+        for conn in connections:
+            _shutdown(conn)  # Readers and clients blocked in recv() get EOFError
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _fail_pending(self, error):
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                return
+            if request is None:
+                continue
+            try:
+                with request.lock:
+                    request.conn.send((request.request_id, None, error))
+            except OSError:
+                pass
+
+    def _read_loop(self, conn):
+        lock = threading.Lock()  # Replies to one connection must not interleave
+        try:
+            while self.running:
+                request_id, kind, payload = conn.recv()
+                self.requests.put(_Request(conn, lock, request_id, kind, payload))
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self.connections_lock:
+                self.connections.discard(conn)
+            conn.close()
+
+    def _collect(self):
+        """
+        Waits for one request, then takes every request already queued
+        until the batch holds max_batch crops. With max_delay set, a batch
+        that is not full also waits until the first request is max_delay
+        old for more to arrive.
+        """
+        first = self.requests.get()
+        if first is None:
+            return []
+        batch = [first]
+        crops = len(first.payload) if first.kind == DETECT else 0
+        deadline = first.arrived + self.max_delay
+        while crops < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    request = self.requests.get(timeout=timeout)
+                else:
+                    request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self.requests.put(None)
+                break
+            batch.append(request)
+            if request.kind == DETECT:
+                crops += len(request.payload)
+        return batch
+
+    def _batch_loop(self):
+        while self.running:
+            batch = self._collect()
+            if batch:
+                self._answer(batch)
+
+    def _answer(self, batch):
+        """
+        Answers every request of the batch. Requests are checked one by one
+        and the detect and action groups run separately, so a bad request
+        or a failing group only fails its own requests, never those of the
+        other clients that happened to share the batch.
+        """
+        results, errors = {}, {}
+        detect, act = [], []
+        for request in batch:
+            error = self._check(request)
+            if error:
+                errors[id(request)] = error
+            elif request.kind == DETECT:
+                detect.append(request)
+            else:
+                act.append(request)
+
+        for group, run in ((detect, self._detect), (act, self._best_actions)):
+            if not group:
+                continue
+            try:
+                results.update(run(group))
+            except Exception as e:
+                for request in group:
+                    errors[id(request)] = f"{type(e).__name__}: {e}"
+
+        for request in batch:
+            reply = (request.request_id, results.get(id(request)), errors.get(id(request)))
+            try:
+                with request.lock:
+                    request.conn.send(reply)
+            except OSError:
+                pass  # Client went away
+
+    def _check(self, request):
+        """Error text for a malformed request, None when it can be batched."""
+        if request.kind == DETECT:
+            for crop in request.payload:
+                if not (isinstance(crop, np.ndarray) and crop.dtype == np.uint8
+                        and crop.ndim == 3 and crop.shape[2] == 3 and crop.size):
+                    return "ValueError: crops must be non-empty (height, width, 3) uint8 arrays"
+            return None
+        if request.kind == ACTION:
+            rows = len(self.q_table)
+            for index in request.payload:
+                if not isinstance(index, int) or not 0 <= index < rows:
+                    return f"IndexError: state index {index} outside the Q-table (0..{rows - 1})"
+            return None
+        return f"ValueError: unknown request kind {request.kind!r}"
+
+    def _best_actions(self, requests):
+        indices = np.concatenate([np.asarray(request.payload, dtype=np.intp) for request in requests])
+        actions = self.q_table[indices].argmax(axis=1).tolist()
+        return self._split(requests, actions)
+
+    def _detect(self, requests):
+        import yolo
+        detector = self.detector
+        crops = [crop for request in requests for crop in request.payload]
+        images = [yolo.preprocess(crop, detector.input_size) for crop in crops]
+        confidences = []
+        for start in range(0, len(images), self.max_batch):
+            confidences.extend(detector(images[start:start + self.max_batch]))
+            self.batches += 1
+        self.crops += len(images)
+        return self._split(requests, confidences)
+
+    @staticmethod
+    def _split(requests, values):
+        """Hands each request its slice of the values computed for the whole group."""
+        results = {}
+        start = 0
+        for request in requests:
+            results[id(request)] = values[start:start + len(request.payload)]
+            start += len(request.payload)
+        return results
+
+
+class InferenceClient:
+    """
+    Connection to an InferenceServer. Calls block until the server has
+    answered, at most `timeout` seconds; they are safe to make from
+    several threads.
+    """
+    def __init__(self, address, timeout=30.0):
+        self.conn = Client(address, family="AF_UNIX")
+        self.lock = threading.Lock()
+        self.timeout = timeout  # Seconds to wait for a reply before giving up
+        self.next_id = 0
+
+    def _call(self, kind, payload):
+        with self.lock:
+            self.next_id += 1
+            request_id = self.next_id
+            try:
+                self.conn.send((request_id, kind, payload))
+                answered = self.conn.poll(self.timeout)
+                if answered:
+                    reply_id, result, error = self.conn.recv()
+            except (EOFError, OSError) as e:
+                raise ConnectionError(f"inference server: connection lost ({type(e).__name__})") from e
+            if not answered:
+                self.conn.close()  # A late reply would be read as the answer to the next call
+                raise TimeoutError(f"inference server: no reply within {self.timeout} s")
+        if error:
+            raise RuntimeError(f"inference server: {error}")
+        assert reply_id == request_id
+        return result
+
+    def detect(self, crops):
+        """Human confidence (or False) for each RGB crop (uint8 array)."""
+        if not len(crops):
+            return []
+        return self._call(DETECT, [np.ascontiguousarray(crop) for crop in crops])
+
+    def best_actions(self, indices):
+        """Best action of the shared Q-table for each state index."""
+        return self._call(ACTION, [int(index) for index in indices])
+
+    def close(self):
+        self.conn.close()
+
+
+_client = None
+
+
+def get_client():
+    """
+    The process-wide client for settings.INFERENCE_SERVER, connected on
+    first use, or None when no server is configured.
+    """
+    global _client
+    if _client is None:
+        from settings import INFERENCE_SERVER
+        if INFERENCE_SERVER:
+            _client = InferenceClient(INFERENCE_SERVER)
+    return _client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve batched detection and policy requests over a Unix socket.")
+    parser.add_argument("--socket", default="/tmp/av-inference.sock", help="Unix socket path to listen on")
+    parser.add_argument("--q-table", default="off.pkl", help="Pickled Q-table shared by all clients")
+    parser.add_argument("--max-batch", type=int, default=64, help="Most crops per detector call")
+    parser.add_argument("--max-delay-ms", type=float, default=0.0,
+                        help="Extra time a batch waits for more requests (default: dispatch what is queued)")
+    args = parser.parse_args()
+
+    server = InferenceServer(args.socket, args.q_table, args.max_batch, args.max_delay_ms / 1000)
+    print(f"serving on {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
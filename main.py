@@ -1,24 +1,33 @@
 import pygame
-from settings import WIDTH, HEIGHT, CELL_SIZE, ROWS, COLS, WHITE
+from settings import WIDTH, HEIGHT, CELL_SIZE, ROWS, COLS, WHITE, PROFILING, PROFILE_OVERLAY, PROFILE_EXPORT, SEED, TICK_RATE, FAST_MODE, IDLE_RATE, TRACE_PATH
 from firstgrid import initialize_grid
 from pedestrian import PedestrianManager
 from garbage import Garbage
 from button import Button
 from game_state import GameState
 import callback
+import simulation
+from profiler import profiler
+from rng import SimulationRNG
+from sim_clock import SimulationClock
+from replay import TraceWriter
+from text_cache import render_text
 
 pygame.init()
 screen = pygame.display.set_mode((WIDTH, HEIGHT + 60))
 pygame.display.set_caption("Autonomous Vehicle Simulation")
-clock = pygame.time.Clock()
+profiler.enabled = PROFILING
+trace = TraceWriter(TRACE_PATH, ROWS, COLS) if TRACE_PATH else None
 
 # Initial grid and other objects
-grid, building_positions = initialize_grid(ROWS, COLS)
-pedestrians = PedestrianManager()
-garbage = Garbage()
+rng = SimulationRNG(SEED)
+grid, building_positions = initialize_grid(ROWS, COLS, rng=rng)
+pedestrians = PedestrianManager(rng.stream("pedestrians"))
+garbage = Garbage(rng.stream("garbage"))
 
 # Gamestate object
-state = GameState(grid, building_positions, pedestrians, garbage)
+state = GameState(grid, building_positions, pedestrians, garbage, rng,
+                  SimulationClock(TICK_RATE, fast=FAST_MODE, idle_rate=IDLE_RATE))
 
 #Buttons and callbacks
 buttons = [
@@ -33,7 +42,8 @@ buttons = [
 
 running = True
 while running:
-    clock.tick(2)
+    state.clock.wait(simulation.is_active(state))
+    profiler.mark_frame()
     screen.fill(WHITE)
 
     #event loop
@@ -58,15 +68,10 @@ while running:
                     state.end_list.append((row, col))
                     state.grid[row][col].set_type("goal")
                     if not state.vehicle and state.start:
-                        from astar import astar
-                        path = astar(state.start, state.end_list[0], state.grid)
-                        destination_queue = state.end_list[1:] if len(state.end_list) > 1 else []
-                        from vehicle import Vehicle
-                        state.vehicle = Vehicle(state.start, path, destination_queue=destination_queue, initial_target=state.end_list[0])
-                        state.vehicle1 = Vehicle(state.start, path, destination_queue=destination_queue.copy(), initial_target=state.end_list[0], img_type="car1")
+                        callback.spawn_fleet(state)
                     elif state.vehicle:
-                        state.vehicle.destinations.append((row, col))
-                        state.vehicle1.destinations.append((row, col))
+                        for vehicle in state.fleet:
+                            vehicle.destinations.append((row, col))
                     state.mode = None
                 #add pedestrian
                 elif state.mode == "pedestrian" and state.grid[row][col].type == "empty":
@@ -75,54 +80,32 @@ while running:
                     state.mode = None
 
 
-    state.garbage.add_garbage()
-
-    # move pedestrians and garbage
-    if state.vehicle and state.start_simulation and state.vehicle.pos != state.end_list[-1] and state.vehicle1.pos != state.end_list[-1]:
-        state.pedestrians.move_pedestrians(state.grid, state.vehicle.pos)
-        state.garbage.move_garbage(state.grid, state.vehicle.pos)
-
-    # check if vehicles reached and save the time
-    if state.vehicle and state.vehicle.pos == state.end_list[-1] and not state.v_reached[0]:
-        state.v_reached[0] = True
-        import time
-        state.end_time_v1 = time.time()
-        with open("record.txt", "a") as f:
-            f.write(f"vehicle1:{round(state.end_time_v1 - state.start_time, 3)} ")
-
-    if state.vehicle1 and state.vehicle1.pos == state.end_list[-1] and not state.v_reached[1]:
-        state.v_reached[1] = True
-        import time
-        state.end_time_v2 = time.time()
-        with open("record.txt", "a") as f:
-            f.write(f"vehicle2:{round(state.end_time_v2 - state.start_time, 3)} \n")
-
-    # sraw each cell on the grid
-    for row in state.grid:
-        for cell in row:
-            cell.draw(screen, CELL_SIZE)
-
-    #draw pedestrians and garbage
-    state.pedestrians.draw(screen)
-    state.garbage.draw(screen)
-
-    #move and draw vehciles
-    if state.vehicle and state.start_simulation:
-        state.vehicle.move(screen, state.grid)
-        state.vehicle1.move_normal(screen, state.grid)
-        state.vehicle.draw(screen)
-        state.vehicle1.draw(screen, False)
+    simulation.update(state, screen, trace=trace)
 
     #draw the buttons
     for button in buttons:
         button.draw(screen)
 
     if state.mode:
-        font = pygame.font.SysFont(None, 28)
         info_text = f"Click on any cell on the grid to set the location of {state.mode} point"
-        info_surface = font.render(info_text, True, (0, 0, 0))
+        info_surface = render_text(info_text, 28, (0, 0, 0))
         screen.blit(info_surface, (10, HEIGHT - 30))
 
-    pygame.display.update()
+    if PROFILE_OVERLAY:
+        profiler.draw(screen, 840, HEIGHT - 130)
+
+    with profiler.phase("display"):
+        pygame.display.update()
+
+print(f"{state.clock.step} simulation steps in {state.clock.wall_elapsed():.1f} s "
+      f"({state.clock.steps_per_second():.1f} steps/s)")
+
+if trace:
+    trace.close()
+if state.fleet.event_sink:
+    state.fleet.event_sink.close()
+
+if profiler.enabled and PROFILE_EXPORT:
+    profiler.export(PROFILE_EXPORT)
 
 pygame.quit()
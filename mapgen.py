@@ -0,0 +1,109 @@
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from settings import DIRECTIONS, MAP_POOL_MIN_CELLS
+
+# One generated map. Cells are (row, col) tuples; every goal is reachable from start.
+MapSpec = namedtuple("MapSpec", ["rows", "cols", "buildings", "start", "goals", "pedestrians"])
+
+
+def sample_cells(rng, rows, cols, count, exclude=()):
+    """
+    Draws `count` distinct cells in one rng.sample call (no rejection
+    loop), skipping the cells in `exclude`.
+    """
+    exclude = {r * cols + c for r, c in exclude}
+    if exclude:
+        candidates = [i for i in range(rows * cols) if i not in exclude]
+    else:
+        candidates = range(rows * cols)
+    return [(i // cols, i % cols) for i in rng.sample(candidates, count)]
+
+
+def reachable(start, rows, cols, blocked):
+    """Cells reachable from start without entering `blocked` (one flood fill)."""
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        r, c = queue.popleft()
+        for dr, dc in DIRECTIONS:
+            nxt = (r + dr, c + dc)
+            if 0 <= nxt[0] < rows and 0 <= nxt[1] < cols and nxt not in seen and nxt not in blocked:
+                seen.add(nxt)
+                queue.append(nxt)
+    return seen
+
+
+def generate_map(rng, rows, cols, buildings=8, goals=(1, 3), pedestrians=(3, 6)):
+    """
+    Generates one map from `rng` (a random.Random). Buildings are sampled
+    without replacement, the start is drawn from the free cells and the
+    goals only from the cells a flood fill reaches from the start, so the
+    first planned path is never empty. Counts given as (low, high) ranges
+    are drawn once, inclusive.
+    """
+    goal_count = rng.randint(*goals)
+    pedestrian_count = rng.randint(*pedestrians)
+    while True:
+        blocked = set(sample_cells(rng, rows, cols, buildings))
+        start = sample_cells(rng, rows, cols, 1, blocked)[0]
+        component = reachable(start, rows, cols, blocked)
+        if len(component) > goal_count:
+            break
+        # The start is walled in; rare on sparse maps, so simply draw again
+    targets = rng.sample(sorted(component - {start}), goal_count)
+    occupied = blocked | {start} | set(targets)
+    walkers = sample_cells(rng, rows, cols, min(pedestrian_count, rows * cols - len(occupied)), occupied)
+    return MapSpec(rows, cols, tuple(sorted(blocked)), start, tuple(targets), tuple(walkers))
+
+
+class MapPool:
+    """
+    Generates maps ahead of time in worker processes (generation is pure
+    Python, so threads would only take turns on the GIL). The pool keeps a
+    ring of `size` pending futures; pop() takes the oldest and submits the
+    next, so consumers (e.g. HybridEnvironment.reset) rarely wait. Map i is
+    drawn from its own stream rng.fork("map:i"), so the sequence of maps
+    depends only on the seed, not on worker timing. Sending each map back
+    costs more than generating a small one: see use_pool().
+    """
+    def __init__(self, rng, rows, cols, size=32, workers=2, **options):
+        self.rng = rng
+        self.rows, self.cols = rows, cols
+        self.options = options  # Extra generate_map() arguments
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.index = 0          # Index of the next map to submit
+        for _ in range(size):
+            self._submit()
+
+    def _submit(self):
+        stream = self.rng.fork(f"map:{self.index}")
+        self.pending.append(self.executor.submit(generate_map, stream, self.rows, self.cols, **self.options))
+        self.index += 1
+
+    def pop(self):
+        """Returns the next map (a MapSpec) and queues a replacement."""
+        future = self.pending.popleft()
+        self._submit()
+        return future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def use_pool(rows, cols, min_cells=MAP_POOL_MIN_CELLS):
+    """
+    True when a MapPool is worth it: the map has at least `min_cells`
+    cells and there is a spare CPU to generate on. Smaller maps generate
+    faster inline than a worker can hand them over.
+    """
+    return rows * cols >= min_cells and (os.cpu_count() or 1) > 1
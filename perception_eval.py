@@ -0,0 +1,316 @@
+"""
+Offline perception dataset and batch evaluation of the YOLO detector.
+
+`export` renders seeded scenes exactly like the simulation draws them,
+cuts every cell into a CELL_SIZE x CELL_SIZE crop and labels it from the
+grid (a "pedestrian" cell is positive, everything else negative). Crops are
+written in fixed-size chunks of memory-mapped .npy files next to a
+meta.json, so datasets larger than memory can be streamed.
+
+`eval` streams the crops through the detector in large batches for every
+combination of resize filter and input size and reports precision, recall
+(also per pedestrian sprite) and throughput, which shows the cheapest input
+resolution that still keeps recall:
+
+    python perception_eval.py export crops --maps 200 --seed 0
+    python perception_eval.py eval crops --sizes 96 160 224 --interpolations cubic area
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # Render scenes without opening a window
+
+import argparse
+import json
+import sys
+import time
+import numpy as np
+import pygame
+
+from settings import ROWS, COLS, CELL_SIZE
+from firstgrid import initialize_grid
+from pedestrian import PedestrianManager
+from garbage import Garbage
+from rng import SimulationRNG
+
+PEDESTRIAN_SPRITES = ["images/yaya.png", "images/yaya1.jpg", "images/yaya2.jpg", "images/yaya5.png"]
+# Cell types stored per crop; the label is derived from these
+CELL_TYPES = ["empty", "building", "pedestrian", "garbage", "start", "goal", "car", "car1"]
+
+
+def _interpolations():
+    import cv2
+    return {
+        "nearest": cv2.INTER_NEAREST,
+        "linear": cv2.INTER_LINEAR,
+        "cubic": cv2.INTER_CUBIC,
+        "area": cv2.INTER_AREA,
+        "lanczos": cv2.INTER_LANCZOS4,
+    }
+
+
+def render_scene(seed, pedestrians=12, vehicles=2):
+    """
+    Builds and draws one seeded map with pedestrians, garbage, a start, a
+    goal and a few vehicles on it. Returns (surface, grid, sprite per cell),
+    where the sprite is the pedestrian image path of pedestrian cells.
+    """
+    rng = SimulationRNG(seed)
+    grid, _ = initialize_grid(ROWS, COLS, rng=rng)
+    placement = rng.stream("placement")
+    free = [(r, c) for r in range(ROWS) for c in range(COLS) if grid[r][c].type == "empty"]
+    placement.shuffle(free)
+
+    people = PedestrianManager(rng.stream("pedestrians"))
+    for pos in free[:pedestrians]:
+        grid[pos[0]][pos[1]].set_type("pedestrian")
+        people.add_pedestrian(pos)
+    free = free[pedestrians:]
+
+    garbage = Garbage(rng.stream("garbage"))
+    garbage.add_garbage()
+    garbage.positions = [p for p in garbage.positions if grid[p[0]][p[1]].type == "empty"]
+    for r, c, _ in garbage.positions:
+        grid[r][c].set_type("garbage")
+    free = [pos for pos in free if grid[pos[0]][pos[1]].type == "empty"]
+
+    for cell_type, pos in zip(["start", "goal"] + ["car", "car1"] * vehicles, free):
+        grid[pos[0]][pos[1]].set_type(cell_type)
+
+    surface = pygame.Surface((COLS * CELL_SIZE, ROWS * CELL_SIZE))
+    surface.fill((255, 255, 255))
+    for row in grid:
+        for cell in row:
+            cell.draw(surface, CELL_SIZE)
+    people.draw(surface)
+    garbage.draw(surface)
+    sprites = {(r, c): path for r, c, path in people.positions}
+    return surface, grid, sprites
+
+
+class CropDataset:
+    """
+    Read-only view of an exported dataset. Chunks are memory-mapped, so
+    only the batches being evaluated are ever paged in.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.chunks = [
+            {name: np.load(os.path.join(path, file), mmap_mode="r") for name, file in chunk["files"].items()}
+            for chunk in self.meta["chunks"]
+        ]
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def batches(self, batch_size=256):
+        """Yields (crops, labels, types, sprites) arrays of at most batch_size crops."""
+        for chunk, info in zip(self.chunks, self.meta["chunks"]):
+            for start in range(0, info["count"], batch_size):
+                end = min(start + batch_size, info["count"])
+                yield tuple(chunk[name][start:end] for name in ("crops", "labels", "types", "sprites"))
+
+
+class _ChunkWriter:
+    """Fills memory-mapped chunk files of `chunk_size` crops one crop at a time."""
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.arrays = None
+        self.fill = 0
+        self.positives = 0
+
+    def _open_chunk(self):
+        index = len(self.chunks)
+        shapes = {
+            "crops": ((self.chunk_size, CELL_SIZE, CELL_SIZE, 3), np.uint8),
+            "labels": ((self.chunk_size,), np.uint8),
+            "types": ((self.chunk_size,), np.uint8),
+            "sprites": ((self.chunk_size,), np.int8),
+        }
+        files = {name: f"{name}_{index:05d}.npy" for name in shapes}
+        self.arrays = {
+            name: np.lib.format.open_memmap(os.path.join(self.path, files[name]), mode="w+", dtype=dtype, shape=shape)
+            for name, (shape, dtype) in shapes.items()
+        }
+        self.chunks.append({"files": files, "count": 0})
+        self.fill = 0
+
+    def add(self, crop, label, cell_type, sprite):
+        if self.arrays is None or self.fill == self.chunk_size:
+            self.flush()
+            self._open_chunk()
+        i = self.fill
+        self.arrays["crops"][i] = crop
+        self.arrays["labels"][i] = label
+        self.arrays["types"][i] = cell_type
+        self.arrays["sprites"][i] = sprite
+        self.fill += 1
+        self.positives += int(label)
+        self.chunks[-1]["count"] = self.fill
+
+    def flush(self):
+        if self.arrays is not None:
+            for array in self.arrays.values():
+                array.flush()
+            self.arrays = None
+
+
+def export_dataset(path, maps=100, seed=0, chunk_size=4096):
+    """
+    Renders `maps` seeded scenes and writes every cell crop with its label.
+    The last chunk is padded; meta.json records how many crops each chunk holds.
+    Returns the number of crops written.
+    """
+    os.makedirs(path, exist_ok=True)
+    writer = _ChunkWriter(path, chunk_size)
+    for index in range(maps):
+        surface, grid, sprites = render_scene(seed * 100003 + index)
+        pixels = pygame.surfarray.array3d(surface).swapaxes(0, 1)  # (height, width, RGB)
+        for r, row in enumerate(grid):
+            for c, cell in enumerate(row):
+                crop = pixels[r * CELL_SIZE:(r + 1) * CELL_SIZE, c * CELL_SIZE:(c + 1) * CELL_SIZE]
+                sprite = PEDESTRIAN_SPRITES.index(sprites[(r, c)]) if (r, c) in sprites else -1
+                writer.add(crop, cell.type == "pedestrian", CELL_TYPES.index(cell.type), sprite)
+    writer.flush()
+
+    count = sum(chunk["count"] for chunk in writer.chunks)
+    meta = {
+        "count": count,
+        "positives": writer.positives,
+        "cell_size": CELL_SIZE,
+        "maps": maps,
+        "seed": seed,
+        "chunk_size": chunk_size,
+        "cell_types": CELL_TYPES,
+        "pedestrian_sprites": PEDESTRIAN_SPRITES,
+        "chunks": writer.chunks,
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return count
+
+
+def evaluate(dataset, size, interpolation, batch_size=256, threshold=0.0):
+    """
+    Runs the detector over the whole dataset at one input size and resize
+    filter. A crop counts as a detection when the human confidence exceeds
+    `threshold`. Returns precision, recall, per-sprite recall and timings.
+    """
+    import yolo
+    flag = _interpolations()[interpolation]
+    sprites = dataset.meta["pedestrian_sprites"]
+    tp = fp = fn = tn = 0
+    sprite_hits = np.zeros(len(sprites), dtype=int)
+    sprite_totals = np.zeros(len(sprites), dtype=int)
+    preprocess_time = detect_time = 0.0
+
+    for crops, labels, _, crop_sprites in dataset.batches(batch_size):
+        started = time.perf_counter()
+        images = [yolo.preprocess(crop, size, flag) for crop in crops]
+        preprocess_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        confidences = yolo.detect(images, imgsz=size)
+        detect_time += time.perf_counter() - started
+
+        predicted = np.array([bool(conf) and conf > threshold for conf in confidences])
+        labels = labels.astype(bool)
+        tp += int(np.sum(predicted & labels))
+        fp += int(np.sum(predicted & ~labels))
+        fn += int(np.sum(~predicted & labels))
+        tn += int(np.sum(~predicted & ~labels))
+        positive = crop_sprites >= 0
+        np.add.at(sprite_totals, crop_sprites[positive], 1)
+        np.add.at(sprite_hits, crop_sprites[positive & predicted], 1)
+
+    total_time = preprocess_time + detect_time
+    return {
+        "size": size,
+        "interpolation": interpolation,
+        "crops": len(dataset),
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+        "recall_per_sprite": {
+            sprite: (int(hits) / int(total) if total else None)
+            for sprite, hits, total in zip(sprites, sprite_hits, sprite_totals)
+        },
+        "preprocess_s": preprocess_time,
+        "detect_s": detect_time,
+        "crops_per_s": len(dataset) / total_time if total_time else 0.0,
+    }
+
+
+def cheapest(results, recall_tolerance=0.01):
+    """
+    Returns the fastest setting whose recall is within `recall_tolerance`
+    of the best recall measured, or None for an empty result list.
+    """
+    if not results:
+        return None
+    best_recall = max(result["recall"] for result in results)
+    keeping = [result for result in results if result["recall"] >= best_recall - recall_tolerance]
+    return max(keeping, key=lambda result: result["crops_per_s"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export labelled cell crops and evaluate the detector on them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Render seeded scenes into a crop dataset")
+    export.add_argument("path", help="Dataset directory")
+    export.add_argument("--maps", type=int, default=100, help="Number of scenes to render")
+    export.add_argument("--seed", type=int, default=0, help="Seed of the first scene")
+    export.add_argument("--chunk-size", type=int, default=4096, help="Crops per memory-mapped chunk")
+
+    run = commands.add_parser("eval", help="Evaluate the detector on a crop dataset")
+    run.add_argument("path", help="Dataset directory")
+    run.add_argument("--sizes", type=int, nargs="+", default=[96, 160, 224, 320], help="Input sizes to compare")
+    run.add_argument("--interpolations", nargs="+", default=["cubic"], choices=sorted(_interpolations()),
+                     help="Resize filters to compare")
+    run.add_argument("--batch", type=int, default=256, help="Crops per detector call")
+    run.add_argument("--threshold", type=float, default=0.0, help="Minimum confidence counted as a detection")
+    run.add_argument("--recall-tolerance", type=float, default=0.01,
+                     help="Recall the cheapest recommended setting may lose against the best one")
+    run.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    pygame.init()
+    if args.command == "export":
+        count = export_dataset(args.path, args.maps, args.seed, args.chunk_size)
+        print(f"wrote {count} crops to {args.path}", file=sys.stderr)
+        return
+
+    import yolo
+    dataset = CropDataset(args.path)
+    sizes = args.sizes
+    detector = yolo.get_detector()
+    if getattr(detector, "fixed_size", False):
+        # An exported model runs at its one input size only
+        skipped = [size for size in sizes if size != detector.input_size]
+        if skipped:
+            print(f"skipping sizes {skipped}: the detector has a fixed {detector.input_size}px input", file=sys.stderr)
+        sizes = [detector.input_size]
+    results = []
+    for interpolation in args.interpolations:
+        for size in sizes:
+            print(f"evaluating {interpolation} {size} ...", file=sys.stderr)
+            results.append(evaluate(dataset, size, interpolation, args.batch, args.threshold))
+    report = {
+        "dataset": dataset.meta["count"],
+        "positives": dataset.meta["positives"],
+        "results": results,
+        "cheapest": cheapest(results, args.recall_tolerance),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
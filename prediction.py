@@ -0,0 +1,84 @@
+import numpy as np
+from settings import DIRECTIONS
+
+
+def transition_matrix(keep=0.8):
+    """
+    Direction change probabilities of a pedestrian for one tick, following
+    PedestrianManager.move_pedestrians: the direction is kept with
+    probability `keep`, otherwise a random direction is drawn and accepted
+    only if it passes the same check as the manager (mr != -dr and mc != dc).
+    Returns a 4x4 matrix T with T[i, j] = P(next direction j | direction i).
+    """
+    n = len(DIRECTIONS)
+    T = np.zeros((n, n))
+    for i, (dr, dc) in enumerate(DIRECTIONS):
+        T[i, i] += keep
+        for j, (mr, mc) in enumerate(DIRECTIONS):
+            if mr != -dr and mc != dc:
+                T[i, j] += (1 - keep) / n
+            else:
+                T[i, i] += (1 - keep) / n
+    return T
+
+
+def _shift(field, dr, dc):
+    """Moves the contents of a (..., rows, cols) array by (dr, dc), dropping what leaves the map."""
+    out = np.zeros_like(field)
+    rows, cols = field.shape[-2:]
+    out[..., max(dr, 0):rows + min(dr, 0), max(dc, 0):cols + min(dc, 0)] = \
+        field[..., max(-dr, 0):rows + min(-dr, 0), max(-dc, 0):cols + min(-dc, 0)]
+    return out
+
+
+def predict_occupancy(positions, directions, grid_matrix, horizon=3, keep=0.8):
+    """
+    Projects where pedestrians may be over the next `horizon` ticks.
+    Each pedestrian's (cell, direction) distribution is propagated with the
+    manager's persistence rule; a blocked move keeps it in place. All
+    pedestrians are propagated at once as one (N, 4, rows, cols) array.
+    Returns an array of shape (horizon, rows, cols) holding, per tick, the
+    probability that at least one pedestrian occupies each cell.
+    """
+    rows, cols = len(grid_matrix), len(grid_matrix[0])
+    occupancy = np.zeros((horizon, rows, cols))
+    if not positions:
+        return occupancy
+
+    # Pedestrians only step onto empty cells; other pedestrians move away, so they are not obstacles
+    blocked = np.array([[cell.type not in ("empty", "pedestrian") for cell in row] for row in grid_matrix])
+    # can_move[k, r, c]: a pedestrian at (r, c) heading in direction k can step forward
+    can_move = np.stack([_shift(~blocked, -dr, -dc) for dr, dc in DIRECTIONS])
+
+    n = len(positions)
+    state = np.zeros((n, len(DIRECTIONS), rows, cols))
+    idx = np.arange(n)
+    rs = np.array([p[0] for p in positions])
+    cs = np.array([p[1] for p in positions])
+    ks = np.array([DIRECTIONS.index(tuple(d)) for d in directions])
+    state[idx, ks, rs, cs] = 1.0
+
+    T = transition_matrix(keep)
+    for h in range(horizon):
+        state = np.einsum("nkrc,kj->njrc", state, T)
+        moving = state * can_move
+        state = state - moving
+        for k, (dr, dc) in enumerate(DIRECTIONS):
+            state[:, k] += _shift(moving[:, k], dr, dc)
+        per_pedestrian = state.sum(axis=1)
+        occupancy[h] = 1.0 - np.prod(1.0 - per_pedestrian, axis=0)
+    return occupancy
+
+
+def occupancy_cost(occupancy, weight=4.0):
+    """Turns predicted occupancy into an extra per-cell step cost for astar()."""
+    return weight * occupancy.max(axis=0)
+
+
+def predicted_conflict(path, step, occupancy, threshold=0.5):
+    """
+    True when a pedestrian is likely to stand on the path ahead: the cell
+    k + 1 steps past `step` is checked against the occupancy of tick k.
+    """
+    ahead = path[step + 1:step + 1 + len(occupancy)]
+    return any(occupancy[k][r][c] >= threshold for k, (r, c) in enumerate(ahead))
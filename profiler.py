@@ -0,0 +1,128 @@
+import json
+import math
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Shared no-op context returned while profiling is disabled, so a disabled
+# `with profiler.phase(...)` costs one attribute check and nothing else.
+_DISABLED = nullcontext()
+
+
+class _PhaseTimer:
+    """Context manager that records the elapsed time of one phase."""
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Profiler:
+    """
+    Collects per-phase timings of the simulation loop.
+    Keeps a rolling window of samples per phase and reports p50/p95/p99
+    in milliseconds. When disabled, phase() returns a shared no-op context.
+    """
+    def __init__(self, enabled=False, window=500):
+        self.enabled = enabled
+        self.window = window      # Number of samples kept per phase
+        self.samples = {}         # phase name -> deque of durations (seconds)
+        self.counts = {}          # phase name -> total number of samples
+        self._last_frame = None   # perf_counter() value at the previous frame mark
+        self._font = None
+
+    def phase(self, name):
+        """Returns a context manager timing the named phase."""
+        if not self.enabled:
+            return _DISABLED
+        return _PhaseTimer(self, name)
+
+    def record(self, name, seconds):
+        """Adds one duration sample for the given phase."""
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+            self.counts[name] = 0
+        samples.append(seconds)
+        self.counts[name] += 1
+
+    def mark_frame(self):
+        """
+        Records the time elapsed since the previous call as a "frame" sample.
+        Call once per iteration of the main loop.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self.record("frame", now - self._last_frame)
+        self._last_frame = now
+
+    def reset(self):
+        """Drops every collected sample."""
+        self.samples.clear()
+        self.counts.clear()
+        self._last_frame = None
+
+    @staticmethod
+    def _percentile(ordered, q):
+        """Nearest-rank percentile of an already sorted list."""
+        if not ordered:
+            return 0.0
+        rank = min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def summary(self):
+        """
+        Returns {phase: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}}
+        computed over the rolling window of each phase.
+        """
+        result = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[name] = {
+                "count": self.counts[name],
+                "mean_ms": 1000.0 * sum(ordered) / len(ordered) if ordered else 0.0,
+                "p50_ms": 1000.0 * self._percentile(ordered, 50),
+                "p95_ms": 1000.0 * self._percentile(ordered, 95),
+                "p99_ms": 1000.0 * self._percentile(ordered, 99),
+            }
+        return result
+
+    def export(self, path):
+        """Writes the current summary to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"window": self.window, "phases": self.summary()}, f, indent=2)
+
+    def draw(self, surface, x, y):
+        """
+        Draws a small table of phase percentiles at (x, y).
+        Meant for the right-hand panel below the vehicle information panel.
+        """
+        if not self.enabled or not self.samples:
+            return
+        if self._font is None:
+            from text_cache import get_font
+            self._font = get_font(None, 20)
+
+        header = self._font.render("phase         p50    p95    p99 (ms)", True, (0, 51, 51))
+        surface.blit(header, (x, y))
+        y += 18
+        for name, row in sorted(self.summary().items()):
+            line = f"{name[:12]:<12} {row['p50_ms']:6.1f} {row['p95_ms']:6.1f} {row['p99_ms']:6.1f}"
+            surface.blit(self._font.render(line, True, (0, 102, 102)), (x, y))
+            y += 16
+
+
+# Process-wide profiler used by the simulation loop and the vehicles
+profiler = Profiler()
@@ -0,0 +1,472 @@
+"""
+Binary traces of simulation runs and offline playback.
+
+A trace stores, for every simulated tick, the cell types of the grid,
+pedestrian and garbage positions, every vehicle (position, heading, RL
+state and action) and the YOLO detections of that tick. Ticks are
+delta-encoded against the previous one, with a full keyframe every
+`keyframe_interval` ticks, and an index of the keyframes is appended on
+close so a reader can jump to any tick without decoding the whole file.
+
+Recording (see settings.TRACE_PATH, or simulation.run(..., trace=...)):
+
+    writer = TraceWriter("run.trace", ROWS, COLS)
+    ...
+    writer.write(state)   # once per tick
+    writer.close()
+
+Playback, without running YOLO or the simulation again:
+
+    python replay.py run.trace --speed 20
+    python replay.py run.trace --seek 150
+    python replay.py run.trace --summary
+"""
+import argparse
+import json
+import struct
+import zlib
+from collections import namedtuple
+from state_encoder import state_index, decode_state
+
+MAGIC = b"AVTR"
+INDEX_MAGIC = b"AVTI"
+VERSION = 2       # 2: vehicle count widened from one byte to four
+
+# Record tags
+STRING = b"S"    # New entry of the string table (cell types, sprite paths)
+KEYFRAME = b"K"  # Complete state of one tick
+DELTA = b"D"     # Changes against the previous tick
+INDEX = b"I"     # Keyframe index, written on close
+
+_HEADER = struct.Struct("<4sBHHH")     # magic, version, rows, cols, keyframe interval
+_RECORD = struct.Struct("<cI")         # tag, payload length
+_TRAILER = struct.Struct("<Q4s")       # offset of the index record, magic
+_VEHICLE = struct.Struct("<HHhHbBBB")  # row, col, angle, sprite, action, rl state, wait, reached
+_DETECTION = struct.Struct("<HHf")     # row, col, confidence
+_ENTITY = struct.Struct("<HHH")        # row, col, sprite
+_MOVE = struct.Struct("<bb")           # row and column change of one entity
+
+NO_ACTION = -1    # Vehicle did not ask the RL agent this tick
+NO_STATE = 0xFF   # No RL state was computed this tick
+
+VehicleFrame = namedtuple("VehicleFrame", ["pos", "angle", "img_type", "action", "rl_state", "wait_counter", "reached"])
+
+
+class Frame:
+    """
+    The decoded state of one tick. `grid` is a list of rows of cell types,
+    `pedestrians` / `garbage` are (row, col, sprite path) lists like the
+    managers keep, and `detections` maps (row, col) to a YOLO confidence.
+    """
+    def __init__(self, tick, grid, pedestrians, garbage, vehicles, detections):
+        self.tick = tick
+        self.grid = grid
+        self.pedestrians = pedestrians
+        self.garbage = garbage
+        self.vehicles = vehicles
+        self.detections = detections
+
+
+def _pack_state(rl_state):
+    if rl_state is None:
+        return NO_STATE
+    return state_index(rl_state)
+
+
+def _unpack_state(value):
+    if value == NO_STATE:
+        return None
+    return decode_state(value)
+
+
+class TraceWriter:
+    """
+    Streams a run to disk, one record per tick. Only what changed since the
+    previous tick is written, except on keyframes.
+    """
+    def __init__(self, path, rows, cols, keyframe_interval=50):
+        self.file = open(path, "wb")
+        self.rows, self.cols = rows, cols
+        self.keyframe_interval = keyframe_interval
+        self.strings = {}      # string -> id in the trace's string table
+        self.keyframes = []    # (tick, file offset) of every keyframe
+        self.frames = 0        # Ticks written so far
+        self.last_grid = None  # Cell type ids of the previous tick
+        self.last_entities = {}
+        self.file.write(_HEADER.pack(MAGIC, VERSION, rows, cols, keyframe_interval))
+
+    def _record(self, tag, payload):
+        self.file.write(_RECORD.pack(tag, len(payload)))
+        self.file.write(payload)
+
+    def _string_id(self, text):
+        """Returns the id of `text`, adding it to the string table on first use."""
+        sid = self.strings.get(text)
+        if sid is None:
+            sid = self.strings[text] = len(self.strings)
+            self._record(STRING, struct.pack("<H", sid) + text.encode())
+        return sid
+
+    def _entities(self, name, positions, full):
+        """
+        Encodes a pedestrian or garbage list. When the entities are the same
+        as last tick, only their moves are written (two bytes each).
+        """
+        entities = [(r, c, self._string_id(path)) for r, c, path in positions]
+        last = self.last_entities.get(name)
+        self.last_entities[name] = entities
+        if not full and last is not None and len(last) == len(entities) and \
+                all(a[2] == b[2] and abs(b[0] - a[0]) < 128 and abs(b[1] - a[1]) < 128
+                    for a, b in zip(last, entities)):
+            return b"\x01" + b"".join(_MOVE.pack(b[0] - a[0], b[1] - a[1]) for a, b in zip(last, entities))
+        return b"\x00" + struct.pack("<H", len(entities)) + b"".join(_ENTITY.pack(*e) for e in entities)
+
+    def write(self, state, tick=None):
+        """Appends the current tick of `state` (a GameState) to the trace."""
+        tick = state.clock.step if tick is None else tick
+        grid = [self._string_id(cell.type) for row in state.grid for cell in row]
+        full = self.frames % self.keyframe_interval == 0 or self.last_grid is None
+
+        if full:
+            tag = KEYFRAME
+            self.keyframes.append((tick, self.file.tell()))
+            cells = zlib.compress(struct.pack(f"<{len(grid)}H", *grid))
+            payload = [struct.pack("<II", tick, len(cells)), cells]
+        else:
+            tag = DELTA
+            changed = [(i, t) for i, (t, old) in enumerate(zip(grid, self.last_grid)) if t != old]
+            payload = [struct.pack("<IH", tick, len(changed))]
+            payload.extend(struct.pack("<HHH", i // self.cols, i % self.cols, t) for i, t in changed)
+        self.last_grid = grid
+
+        payload.append(self._entities("pedestrians", state.pedestrians.positions, full))
+        payload.append(self._entities("garbage", state.garbage.positions, full))
+
+        fleet = state.fleet
+        payload.append(struct.pack("<I", len(fleet)))
+        for index, vehicle in enumerate(fleet):
+            action = NO_ACTION if vehicle.last_action is None else vehicle.last_action
+            payload.append(_VEHICLE.pack(vehicle.pos[0], vehicle.pos[1], vehicle.angle,
+                                         self._string_id(vehicle.img_type), action,
+                                         _pack_state(vehicle.last_state), min(vehicle.wait_counter, 255),
+                                         fleet.reached[index]))
+
+        detections = fleet.last_detections or {}
+        payload.append(struct.pack("<H", len(detections)))
+        payload.extend(_DETECTION.pack(r, c, float(confidence or 0.0)) for (r, c), confidence in sorted(detections.items()))
+
+        self._record(tag, b"".join(payload))
+        self.frames += 1
+
+    def close(self):
+        """Writes the keyframe index and closes the file."""
+        if self.file.closed:
+            return
+        offset = self.file.tell()
+        entries = b"".join(struct.pack("<IQ", tick, pos) for tick, pos in self.keyframes)
+        self._record(INDEX, struct.pack("<I", len(self.keyframes)) + entries)
+        self.file.write(_TRAILER.pack(offset, INDEX_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class TraceReader:
+    """
+    Reads a trace written by TraceWriter. Traces that were not closed (e.g.
+    a crashed run) have no index; the reader then scans the records once.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        magic, version, self.rows, self.cols, self.keyframe_interval = _HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} simulation trace")
+        self.strings = []
+        self.keyframes = []  # (tick, offset), ordered by tick
+        self.ticks = []      # Every recorded tick
+        self._scan()
+
+    def _records(self, offset=_HEADER.size):
+        """Yields (offset, tag, payload offset, payload length) from `offset` on."""
+        data = self.data
+        while offset + _RECORD.size <= len(data):
+            tag, length = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            if start + length > len(data) or tag == INDEX:
+                return
+            yield offset, tag, start, length
+            offset = start + length
+
+    def _scan(self):
+        """
+        Collects the string table and the recorded ticks. The keyframe index
+        is taken from the trailer when present, otherwise from the scan.
+        """
+        keyframes = []
+        for offset, tag, start, length in self._records():
+            if tag == STRING:
+                sid, = struct.unpack_from("<H", self.data, start)
+                self.strings.append(self.data[start + 2:start + length].decode())
+                assert sid == len(self.strings) - 1
+            else:
+                tick, = struct.unpack_from("<I", self.data, start)
+                self.ticks.append(tick)
+                if tag == KEYFRAME:
+                    keyframes.append((tick, offset))
+        self.keyframes = self._read_index() or keyframes
+
+    def _read_index(self):
+        if len(self.data) < _TRAILER.size:
+            return None
+        offset, magic = _TRAILER.unpack_from(self.data, len(self.data) - _TRAILER.size)
+        if magic != INDEX_MAGIC:
+            return None
+        count, = struct.unpack_from("<I", self.data, offset + _RECORD.size)
+        base = offset + _RECORD.size + 4
+        return [struct.unpack_from("<IQ", self.data, base + 12 * i) for i in range(count)]
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def _entities(self, offset, last):
+        data = self.data
+        kind = data[offset]
+        offset += 1
+        if kind == 1:
+            entities = []
+            for r, c, sprite in last:
+                dr, dc = _MOVE.unpack_from(data, offset)
+                entities.append((r + dr, c + dc, sprite))
+                offset += _MOVE.size
+            return entities, offset
+        count, = struct.unpack_from("<H", data, offset)
+        offset += 2
+        entities = [(r, c, self.strings[s]) for r, c, s in _ENTITY.iter_unpack(data[offset:offset + count * _ENTITY.size])]
+        return entities, offset + count * _ENTITY.size
+
+    def _decode(self, tag, start, frame):
+        """Decodes one tick record on top of `frame` (the previous tick, or None for a keyframe)."""
+        data = self.data
+        if tag == KEYFRAME:
+            tick, size = struct.unpack_from("<II", data, start)
+            offset = start + 8
+            ids = struct.unpack(f"<{self.rows * self.cols}H", zlib.decompress(data[offset:offset + size]))
+            offset += size
+            strings = self.strings
+            grid = [[strings[i] for i in ids[r * self.cols:(r + 1) * self.cols]] for r in range(self.rows)]
+            pedestrians, garbage = [], []
+        else:
+            tick, count = struct.unpack_from("<IH", data, start)
+            offset = start + 6
+            grid = [row[:] for row in frame.grid]
+            for r, c, t in struct.iter_unpack("<HHH", data[offset:offset + count * 6]):
+                grid[r][c] = self.strings[t]
+            offset += count * 6
+            pedestrians, garbage = frame.pedestrians, frame.garbage
+
+        pedestrians, offset = self._entities(offset, pedestrians)
+        garbage, offset = self._entities(offset, garbage)
+
+        vehicles = []
+        count, = struct.unpack_from("<I", data, offset)
+        offset += 4
+        for r, c, angle, sprite, action, rl_state, wait, reached in \
+                _VEHICLE.iter_unpack(data[offset:offset + count * _VEHICLE.size]):
+            vehicles.append(VehicleFrame((r, c), angle, self.strings[sprite],
+                                         None if action == NO_ACTION else action,
+                                         _unpack_state(rl_state), wait, bool(reached)))
+        offset += count * _VEHICLE.size
+
+        count, = struct.unpack_from("<H", data, offset)
+        offset += 2
+        detections = {(r, c): confidence
+                      for r, c, confidence in _DETECTION.iter_unpack(data[offset:offset + count * _DETECTION.size])}
+        return Frame(tick, grid, pedestrians, garbage, vehicles, detections)
+
+    def frames(self, start_tick=None):
+        """Yields every frame, or every frame from the one at `start_tick` on."""
+        offset = _HEADER.size
+        if start_tick is not None:
+            offset = self._keyframe_before(start_tick)
+        frame = None
+        for _, tag, start, _ in self._records(offset):
+            if tag == STRING:
+                continue
+            frame = self._decode(tag, start, frame)
+            if start_tick is None or frame.tick >= start_tick:
+                yield frame
+
+    def _keyframe_before(self, tick):
+        """Offset of the last keyframe at or before `tick` (the first one if none is)."""
+        best = self.keyframes[0][1] if self.keyframes else _HEADER.size
+        for key_tick, offset in self.keyframes:
+            if key_tick > tick:
+                break
+            best = offset
+        return best
+
+    def seek(self, tick):
+        """
+        Returns the frame of `tick` (or the first recorded one after it),
+        decoding at most one keyframe interval of records. None past the end.
+        """
+        return next(self.frames(tick), None)
+
+
+def summarize(reader):
+    """Per-vehicle statistics of a trace, computed without rendering."""
+    action_names = ["Wait", "Forward", "Right", "Left"]
+    vehicles = {}
+    detections = 0
+    for frame in reader.frames():
+        detections += sum(1 for confidence in frame.detections.values() if confidence)
+        for index, vehicle in enumerate(frame.vehicles):
+            stats = vehicles.setdefault(index, {"img_type": vehicle.img_type, "waiting_ticks": 0,
+                                                "actions": {name: 0 for name in action_names},
+                                                "reached_at": None})
+            if vehicle.wait_counter:
+                stats["waiting_ticks"] += 1
+            if vehicle.action is not None:
+                stats["actions"][action_names[vehicle.action]] += 1
+            if vehicle.reached and stats["reached_at"] is None:
+                stats["reached_at"] = frame.tick
+    return {
+        "ticks": len(reader),
+        "first_tick": reader.ticks[0] if reader.ticks else None,
+        "last_tick": reader.ticks[-1] if reader.ticks else None,
+        "human_detections": detections,
+        "vehicles": [vehicles[i] for i in sorted(vehicles)],
+    }
+
+
+class Player:
+    """
+    Renders trace frames with the simulation's sprites. Sprites are loaded
+    once per cell type or path, so playback speed is limited by blitting only.
+    """
+    def __init__(self, reader):
+        import pygame
+        from settings import CELL_SIZE
+        from text_cache import get_font
+        self.pygame = pygame
+        self.reader = reader
+        self.cell_size = CELL_SIZE
+        self.images = {}
+        width, height = reader.cols * CELL_SIZE, reader.rows * CELL_SIZE
+        self.screen = pygame.display.set_mode((width + 300, height))
+        pygame.display.set_caption("Simulation Replay")
+        self.font = get_font(None, 22)
+
+    def _image(self, key):
+        """Sprite for a cell type ("building", "car", ...) or an image path."""
+        image = self.images.get(key)
+        if image is None:
+            import random
+            from grid import Cell
+            if "/" in key:
+                image = self.pygame.transform.scale(self.pygame.image.load(key), (self.cell_size, self.cell_size))
+            else:
+                image = Cell(0, 0, key, rng=random.Random(0)).image
+            self.images[key] = image
+        return image
+
+    def draw(self, frame):
+        pygame, size, screen = self.pygame, self.cell_size, self.screen
+        screen.fill((255, 255, 255))
+        for r, row in enumerate(frame.grid):
+            for c, cell_type in enumerate(row):
+                rect = (c * size, r * size, size, size)
+                if cell_type in ("building", "start", "goal"):
+                    screen.blit(self._image(cell_type), rect[:2])
+                pygame.draw.rect(screen, (150, 150, 150), rect, 1)
+        for r, c, path in frame.pedestrians + frame.garbage:
+            screen.blit(self._image(path), (c * size, r * size))
+        for (r, c), confidence in frame.detections.items():
+            if confidence:
+                pygame.draw.rect(screen, (255, 0, 0), (c * size, r * size, size, size), 3)
+        for vehicle in frame.vehicles:
+            rotated = pygame.transform.rotate(self._image(vehicle.img_type), vehicle.angle)
+            screen.blit(rotated, (vehicle.pos[1] * size, vehicle.pos[0] * size))
+
+        x, y = self.reader.cols * size + 10, 10
+        lines = [f"tick {frame.tick}"]
+        for index, vehicle in enumerate(frame.vehicles):
+            action = "-" if vehicle.action is None else ["Wait", "Forward", "Right", "Left"][vehicle.action]
+            lines.append(f"vehicle{index + 1} {vehicle.pos} wait {vehicle.wait_counter} "
+                         f"state {vehicle.rl_state or '-'} action {action}")
+        for line in lines:
+            screen.blit(self.font.render(line, True, (0, 102, 102)), (x, y))
+            y += 20
+        pygame.display.update()
+
+    def play(self, speed=2.0, start_tick=None):
+        """
+        Plays the trace at `speed` ticks per second.
+        Keys: space pauses, right/left step while paused, up/down change speed.
+        """
+        pygame = self.pygame
+        clock = pygame.time.Clock()
+        ticks = self.reader.ticks
+        position = 0
+        if start_tick is not None:
+            position = next((i for i, t in enumerate(ticks) if t >= start_tick), len(ticks) - 1)
+        frames = self.reader.frames(ticks[position]) if ticks else iter(())
+        frame = next(frames, None)
+        paused = False
+        while frame is not None:
+            step = 0 if paused else 1
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        paused = not paused
+                    elif event.key == pygame.K_UP:
+                        speed *= 2
+                    elif event.key == pygame.K_DOWN:
+                        speed = max(speed / 2, 0.25)
+                    elif event.key == pygame.K_RIGHT:
+                        step = 1
+                    elif event.key == pygame.K_LEFT and position > 0:
+                        # Stepping back re-decodes from the nearest keyframe
+                        position -= 1
+                        frames = self.reader.frames(ticks[position])
+                        frame = next(frames)
+            self.draw(frame)
+            if step:
+                following = next(frames, None)
+                if following is not None:
+                    frame = following
+                    position += 1
+                else:
+                    paused = True
+            clock.tick(speed if not paused else 30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded simulation trace.")
+    parser.add_argument("trace", help="Trace file written by TraceWriter")
+    parser.add_argument("--speed", type=float, default=2.0, help="Ticks per second during playback")
+    parser.add_argument("--seek", type=int, help="Start playback at this tick")
+    parser.add_argument("--summary", action="store_true", help="Print per-vehicle statistics as JSON instead of playing")
+    args = parser.parse_args()
+
+    reader = TraceReader(args.trace)
+    if args.summary:
+        print(json.dumps(summarize(reader), indent=2))
+        return
+
+    import pygame
+    pygame.init()
+    Player(reader).play(args.speed, args.seek)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import hashlib
+import random
+
+
+class SimulationRNG:
+    """
+    Source of all randomness in a simulation run.
+    Every subsystem (map, sprites, pedestrians, garbage, environment) draws
+    from its own random.Random stream derived from one master seed, so the
+    same seed always reproduces the same run and adding draws in one
+    subsystem does not shift the others.
+    """
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 32)
+        self.seed = seed
+        self.streams = {}  # subsystem name -> random.Random
+
+    def stream(self, name):
+        """Returns the random.Random stream of the named subsystem."""
+        rng = self.streams.get(name)
+        if rng is None:
+            rng = self.streams[name] = self.fork(name)
+        return rng
+
+    def fork(self, name):
+        """
+        Returns a fresh random.Random derived from the seed and `name`,
+        without keeping it (e.g. one stream per generated map).
+        """
+        digest = hashlib.sha256(f"{self.seed}:{name}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def getstate(self):
+        """Returns the state of every stream created so far."""
+        return {name: rng.getstate() for name, rng in self.streams.items()}
+
+    def setstate(self, state):
+        """Restores stream states captured by getstate()."""
+        for name, rng_state in state.items():
+            self.stream(name).setstate(rng_state)
@@ -11,3 +11,61 @@ BLUE  = (0, 0, 255)
 GRAY  = (200, 200, 200)
 
 DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # yukarı, aşağı, sol, sağ
+
+# Profiling of the simulation loop (see profiler.py)
+PROFILING = False                 # Enable per-phase timers
+PROFILE_OVERLAY = True            # Show percentiles under the vehicle information panel
+PROFILE_EXPORT = "profile.json"   # Summary written here on exit (None to skip)
+
+# Master seed of the simulation RNG (see rng.py); None picks a fresh seed per run
+SEED = None
+
+# Simulation clock (see sim_clock.py)
+TICK_RATE = 2       # Simulation steps per second in real-time mode
+FAST_MODE = False   # Run simulation steps as fast as possible
+IDLE_RATE = 30      # UI frames per second while the simulation is idle
+
+# Vehicles spawned at the start point: (sprite type, policy), see fleet.POLICIES
+FLEET = [("car", "rl"), ("car1", "normal")]
+FLEET_AVOID_COLLISIONS = False   # Vehicles wait instead of sharing a cell
+FLEET_COOPERATIVE = False        # Plan through a space-time reservation table (see cooperative.py)
+FLEET_WINDOW = 8                 # Ticks each cooperative plan reserves ahead
+
+# Pedestrian motion prediction (see prediction.py), used by the RL vehicles to replan early
+PREDICTION = True
+PREDICTION_HORIZON = 3       # Ticks predicted ahead
+PREDICTION_THRESHOLD = 0.5   # Occupancy probability on the path that triggers a replan
+PREDICTION_WEIGHT = 4.0      # Extra step cost per unit of predicted occupancy
+
+# Fleet planner precedence (see Fleet.plan): COST_MAP, then HPA, then the shared
+# per-goal distance fields, which are the default.
+# Weighted planning (see costmap.py): replans avoid garbage and pedestrian cells instead of
+# running into them, at the price of a full A* search per replan
+COST_MAP = False
+
+# Hierarchical pathfinding (see hpa.py) for large maps, used when COST_MAP is off
+HPA = False
+HPA_CLUSTER_SIZE = 10
+
+# Training maps (see mapgen.py) are generated in worker processes only from this many cells
+# on, and only with a spare CPU; smaller maps generate faster inline (`python benchmark.py --only mapgen`)
+MAP_POOL_MIN_CELLS = 2500
+
+# Binary trace of every simulated tick for offline playback (see replay.py); None disables recording
+TRACE_PATH = None
+
+# Pedestrian detector (see yolo.py): "ultralytics" runs the full model, "onnx" an exported
+# (optionally int8) model through onnxruntime; create it with `python yolo.py --int8`
+DETECTOR_BACKEND = "ultralytics"
+DETECTOR_WEIGHTS = "yolov8n.pt"
+DETECTOR_ONNX_PATH = "yolov8n-int8.onnx"
+DETECTOR_INPUT_SIZE = 160     # Fixed input size of the onnx backend
+DETECTOR_CONFIDENCE = 0.25    # Minimum person score of the onnx backend (ultralytics' default)
+
+# Per-vehicle event ring buffer (see event_log.py)
+EVENT_LOG_CAPACITY = 100   # Events kept per vehicle; the information panel shows the last 25
+EVENT_LOG_PATH = None      # Stream every event of every vehicle to this TSV file (None to skip)
+
+# Shared inference server (see inference_server.py): Unix socket path, or None to run the
+# detector and the Q-table in this process
+INFERENCE_SERVER = None
@@ -0,0 +1,48 @@
+import time
+import pygame
+
+
+class SimulationClock:
+    """
+    Keeps simulation time (in steps) separate from wall-clock time.
+    A step is one update of every entity. In real-time mode steps are paced
+    at `tick_rate` per second for watching; in fast mode they run back to back.
+    While the simulation is idle (not started, or every vehicle has arrived)
+    no entity can change state, so no steps are consumed and the loop only
+    services the UI at `idle_rate`. Active steps are never skipped: every
+    step moves garbage and pedestrians with fresh random draws, and waiting
+    vehicles react to what YOLO sees after each move, so no active span is
+    free of state changes.
+    """
+    def __init__(self, tick_rate=2, fast=False, idle_rate=30):
+        self.tick_rate = tick_rate    # Steps per second in real-time mode
+        self.fast = fast              # Run steps as fast as possible
+        self.idle_rate = idle_rate    # UI frames per second while idle
+        self.step = 0                 # Simulation steps elapsed so far
+        self.wall_start = time.perf_counter()
+        self._pacer = None            # pygame Clock, created on first wait()
+
+    def advance(self, steps=1):
+        """Moves simulation time forward."""
+        self.step += steps
+
+    def wait(self, active):
+        """
+        Paces the main loop: sleeps until the next step is due when active in
+        real-time mode, returns immediately in fast mode, and falls back to
+        the UI rate while idle.
+        """
+        if active and self.fast:
+            return
+        if self._pacer is None:
+            self._pacer = pygame.time.Clock()
+        self._pacer.tick(self.tick_rate if active else self.idle_rate)
+
+    def wall_elapsed(self):
+        """Wall-clock seconds since the clock was created."""
+        return time.perf_counter() - self.wall_start
+
+    def steps_per_second(self):
+        """Average simulation throughput measured against wall time."""
+        elapsed = self.wall_elapsed()
+        return self.step / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,85 @@
+from settings import CELL_SIZE, PREDICTION, PREDICTION_HORIZON
+from profiler import profiler
+from prediction import predict_occupancy
+import event_log
+
+
+def is_active(state):
+    """
+    Returns True while the simulation can still change state: it has been
+    started and at least one vehicle has not reached its final target.
+    """
+    return bool(len(state.fleet) and state.start_simulation and not state.fleet.all_reached())
+
+
+def update(state, screen, record_path="record.txt", trace=None):
+    """
+    Runs one tick of the simulation on the given surface:
+    moves pedestrians and garbage, records arrival steps, draws the map
+    and moves/draws the fleet. Buttons and prompts are left to the caller,
+    so the same tick can be driven headless by the benchmarks.
+    Simulation time advances by one step only while the simulation is active.
+    Active ticks are appended to `trace` (a replay.TraceWriter), if given.
+    """
+    active = is_active(state)
+    state.garbage.add_garbage()
+
+    # move pedestrians and garbage while any vehicle is still on its way
+    if active:
+        with profiler.phase("movement"):
+            state.pedestrians.move_pedestrians(state.grid, state.vehicle.pos, state.fleet.positions())
+            state.garbage.move_garbage(state.grid, state.vehicle.pos, state.fleet.positions())
+        if state.fleet.cost_map:
+            state.fleet.cost_map.update(state.grid, state.garbage.positions, state.pedestrians.positions)
+
+    # check which vehicles reached and save their steps
+    if active:
+        steps = state.clock.step - state.start_step
+        for index in state.fleet.record_arrivals(state.end_list[-1], steps):
+            events = state.fleet.vehicles[index].events
+            events.tick = state.clock.step
+            events.log(event_log.REACHED, value=steps)
+            if record_path:
+                with open(record_path, "a") as f:
+                    f.write(f"vehicle{index + 1}:{steps} steps ")
+                    if state.fleet.all_reached():
+                        f.write("\n")
+
+    # draw each cell on the grid
+    with profiler.phase("cell_draw"):
+        for row in state.grid:
+            for cell in row:
+                cell.draw(screen, CELL_SIZE)
+
+    #draw pedestrians and garbage
+    state.pedestrians.draw(screen)
+    state.garbage.draw(screen)
+
+    #move and draw vehicles
+    if len(state.fleet) and state.start_simulation:
+        occupancy = None
+        if PREDICTION and active:
+            with profiler.phase("prediction"):
+                occupancy = predict_occupancy(state.pedestrians.positions, state.pedestrians.directions,
+                                              state.grid, PREDICTION_HORIZON)
+        with profiler.phase("vehicles"):
+            state.fleet.update(screen, state.grid, state.clock.step, occupancy)
+        state.fleet.draw(screen)
+
+    if active:
+        if trace:
+            with profiler.phase("trace"):
+                trace.write(state)
+        state.clock.advance()
+
+
+def run(state, screen, max_steps=1000, record_path=None, trace=None):
+    """
+    Runs the simulation as fast as possible until it becomes idle or
+    `max_steps` steps have elapsed. Returns the arrival steps of every
+    vehicle (None for a vehicle that did not arrive).
+    """
+    state.start_step = state.clock.step
+    while is_active(state) and state.clock.step - state.start_step < max_steps:
+        update(state, screen, record_path, trace)
+    return list(state.fleet.reach_steps)
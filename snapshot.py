@@ -0,0 +1,147 @@
+import pickle
+from collections import namedtuple
+from vehicle import Vehicle
+
+# Snapshots are built from immutable tuples only. Nothing in a snapshot is
+# ever mutated, so unchanged parts (grid rows, entity lists) can be shared
+# between consecutive snapshots instead of duplicated.
+VehicleSnapshot = namedtuple("VehicleSnapshot", [
+    "img_type", "pos", "path", "step", "angle", "destinations",
+    "current_target", "wait_counter", "events",
+])
+
+GameSnapshot = namedtuple("GameSnapshot", [
+    "grid", "building_positions", "start", "end_list",
+    "pedestrians", "garbage", "vehicles", "policies", "reached", "reach_steps",
+    "start_simulation", "clock_step", "start_step",
+    "counters", "rng_state",
+])
+
+ManagerSnapshot = namedtuple("ManagerSnapshot", ["positions", "initial_positions", "directions"])
+
+
+def _snapshot_vehicle(vehicle):
+    return VehicleSnapshot(
+        vehicle.img_type, vehicle.pos, tuple(vehicle.path), vehicle.step, vehicle.angle,
+        tuple(vehicle.destinations), vehicle.current_target, vehicle.wait_counter,
+        tuple(vehicle.events),
+    )
+
+
+def _snapshot_manager(manager):
+    return ManagerSnapshot(tuple(manager.positions), tuple(manager.initial_positions), tuple(manager.directions))
+
+
+def _share(new, old):
+    """Returns `old` when it equals `new`, so unchanged parts are stored once."""
+    return old if old is not None and old == new else new
+
+
+def take_snapshot(state, previous=None):
+    """
+    Captures the full simulation state: grid types, pedestrians, garbage,
+    vehicles, timing, counters and RNG streams.
+    Passing the previous snapshot lets unchanged rows and lists be shared.
+    """
+    old_rows = previous.grid if previous else ()
+    grid = tuple(
+        _share(tuple(cell.type for cell in row), old_rows[r] if r < len(old_rows) else None)
+        for r, row in enumerate(state.grid)
+    )
+    vehicles = tuple(_snapshot_vehicle(vehicle) for vehicle in state.fleet)
+    pedestrians = _snapshot_manager(state.pedestrians)
+    garbage = _snapshot_manager(state.garbage)
+    if previous:
+        pedestrians = _share(pedestrians, previous.pedestrians)
+        garbage = _share(garbage, previous.garbage)
+
+    return GameSnapshot(
+        grid=grid,
+        building_positions=frozenset(state.building_positions),
+        start=state.start,
+        end_list=tuple(state.end_list),
+        pedestrians=pedestrians,
+        garbage=garbage,
+        vehicles=vehicles,
+        policies=tuple(state.fleet.policies),
+        reached=tuple(state.fleet.reached),
+        reach_steps=tuple(state.fleet.reach_steps),
+        start_simulation=state.start_simulation,
+        clock_step=state.clock.step,
+        start_step=state.start_step,
+        counters=(state.i, state.j, state.k),
+        rng_state=state.rng.getstate() if state.rng else None,
+    )
+
+
+def _restore_vehicle(vehicle, snap):
+    if vehicle is None or vehicle.img_type != snap.img_type:
+        vehicle = Vehicle(snap.pos, [], img_type=snap.img_type)
+    vehicle.pos = snap.pos
+    vehicle.path = list(snap.path)
+    vehicle.step = snap.step
+    vehicle.angle = snap.angle
+    vehicle.destinations = list(snap.destinations)
+    vehicle.current_target = snap.current_target
+    vehicle.wait_counter = snap.wait_counter
+    vehicle.events.restore(snap.events)
+    return vehicle
+
+
+def _restore_manager(manager, snap):
+    manager.positions = list(snap.positions)
+    manager.initial_positions = list(snap.initial_positions)
+    manager.directions = list(snap.directions)
+
+
+def restore_snapshot(state, snap):
+    """
+    Puts the state back to the given snapshot in place.
+    Only cells whose type differs are touched, and existing vehicles are
+    reused, so no sprites or Q-tables are reloaded. Cached map data of the
+    fleet is invalidated for every building that differs.
+    """
+    for row, types in zip(state.grid, snap.grid):
+        for cell, cell_type in zip(row, types):
+            if cell.type != cell_type:
+                cell.set_type(cell_type)
+
+    changed = set(state.building_positions) ^ snap.building_positions
+    state.building_positions.clear()
+    state.building_positions.update(snap.building_positions)
+    state.start = snap.start
+    state.end_list[:] = snap.end_list
+    _restore_manager(state.pedestrians, snap.pedestrians)
+    _restore_manager(state.garbage, snap.garbage)
+
+    fleet = state.fleet
+    existing = list(fleet.vehicles)
+    fleet.clear()
+    for index, (vehicle_snap, policy) in enumerate(zip(snap.vehicles, snap.policies)):
+        vehicle = existing[index] if index < len(existing) else None
+        fleet.add(_restore_vehicle(vehicle, vehicle_snap), policy)
+    fleet.reached = list(snap.reached)
+    fleet.reach_steps = list(snap.reach_steps)
+    if changed:
+        fleet.invalidate_map(changed)  # Distance fields, cost map and HPA* clusters of the old buildings
+
+    state.start_simulation = snap.start_simulation
+    state.clock.step = snap.clock_step
+    state.start_step = snap.start_step
+    state.i, state.j, state.k = snap.counters
+
+    # Restored last: set_type() above draws sprites from the RNG
+    if state.rng and snap.rng_state is not None:
+        state.rng.setstate(snap.rng_state)
+
+
+def save_snapshot(snap, path):
+    """Writes a snapshot to disk."""
+    with open(path, "wb") as f:
+        pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_snapshot(path):
+    """Reads a snapshot written by save_snapshot()."""
+    with open(path, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,53 @@
+import numpy as np
+
+# The RL state is the (front-left, front, front-right) occupancy relative to
+# the heading, packed into the Q-table row index fl * 4 + f * 2 + fr.
+WEIGHTS = (4, 2, 1)
+
+
+def state_index(state):
+    """Q-table row of a (front-left, front, front-right) tuple."""
+    return state[0] * 4 + state[1] * 2 + state[2] * 1
+
+
+def decode_state(index):
+    """Inverse of state_index()."""
+    index = int(index)
+    return (index >> 2 & 1, index >> 1 & 1, index & 1)
+
+
+def occupancy_grid(cells, rows, cols):
+    """(rows, cols) uint8 array with a 1 on every given (row, col, ...) cell."""
+    occupancy = np.zeros((rows, cols), dtype=np.uint8)
+    if cells:
+        cells = np.asarray([(cell[0], cell[1]) for cell in cells])
+        occupancy[cells[:, 0], cells[:, 1]] = 1
+    return occupancy
+
+
+def encode_states(positions, headings, occupancy):
+    """
+    Q-table row indices for many vehicles at once.
+    positions and headings are (N, 2) arrays of (row, col) and (dr, dc);
+    a (0, 0) heading counts as facing up, like Vehicle.get_rl_state.
+    occupancy is a (rows, cols) array, non-zero where a human is. It is
+    padded with empty cells on every side (one for unit headings), so
+    front cells off the map read as free without any bounds checks.
+    """
+    positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+    headings = np.array(headings, dtype=np.intp).reshape(-1, 2)
+    if not len(positions):
+        return np.zeros(0, dtype=np.intp)
+    standing = (headings == 0).all(axis=1)
+    headings[standing] = (-1, 0)
+
+    # A vehicle pushed off its path (lane change) can face a cell further away
+    pad = int(np.abs(headings).sum(axis=1).max())
+    padded = np.pad(np.asarray(occupancy) != 0, pad)
+    r = positions[:, 0] + pad
+    c = positions[:, 1] + pad
+    dr, dc = headings[:, 0], headings[:, 1]
+    front_left = padded[r + dr - dc, c + dc + dr]
+    front = padded[r + dr, c + dc]
+    front_right = padded[r + dr + dc, c + dc - dr]
+    return front_left * WEIGHTS[0] + front * WEIGHTS[1] + front_right * WEIGHTS[2]
@@ -0,0 +1,53 @@
+import random
+import pygame
+import pytest
+
+import fleet as fleet_module
+import vehicle as vehicle_module
+from settings import ROWS, COLS, WIDTH, HEIGHT, PREDICTION_HORIZON
+from firstgrid import initialize_grid
+from pedestrian import PedestrianManager
+from prediction import predict_occupancy
+from rng import SimulationRNG
+from fleet import Fleet
+from vehicle import Vehicle
+
+
+@pytest.fixture(autouse=True)
+def no_detections(monkeypatch):
+    # The vehicles see no humans, so only the planners move them
+    monkeypatch.setattr(fleet_module, "contains_human_batch", lambda crops: [False] * len(crops))
+    monkeypatch.setattr(vehicle_module, "contains_human", lambda crop: False)
+    pygame.init()
+
+
+def free_cells(grid, rng, count):
+    cells = [(r, c) for r in range(ROWS) for c in range(COLS) if grid[r][c].type == "empty"]
+    return rng.sample(cells, count)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cooperative_fleet_with_prediction_never_shares_cells(seed):
+    sim_rng = SimulationRNG(seed)
+    grid, _ = initialize_grid(ROWS, COLS, rng=sim_rng)
+    pedestrians = PedestrianManager(sim_rng.stream("pedestrians"))
+    rng = random.Random(seed)
+    cells = free_cells(grid, rng, 14)
+    for pos in cells[:6]:
+        grid[pos[0]][pos[1]].set_type("pedestrian")
+        pedestrians.add_pedestrian(pos)
+
+    fleet = Fleet(cooperative=True)
+    goal = cells[6]
+    for start in cells[7:]:
+        fleet.add(Vehicle(start, [], initial_target=goal))
+    screen = pygame.Surface((WIDTH, HEIGHT))
+
+    for tick in range(40):
+        pedestrians.move_pedestrians(grid, fleet[0].pos, fleet.positions())
+        occupancy = predict_occupancy(pedestrians.positions, pedestrians.directions, grid, PREDICTION_HORIZON)
+        fleet.update(screen, grid, tick, occupancy)
+        fleet.record_arrivals(goal, tick)
+        for pos, holders in fleet.cells.items():
+            moving = [index for index in holders if not fleet.reached[index]]
+            assert pos in fleet.cooperative.shared or len(moving) <= 1, (tick, pos, moving)
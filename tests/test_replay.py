@@ -0,0 +1,22 @@
+import pygame
+
+from benchmark import make_state
+from replay import TraceWriter, TraceReader
+
+
+def test_trace_round_trip_with_more_than_255_vehicles(tmp_path):
+    pygame.init()
+    state = make_state(0, vehicles=300)
+    path = tmp_path / "fleet.trace"
+    with TraceWriter(str(path), len(state.grid), len(state.grid[0]), keyframe_interval=2) as writer:
+        for tick in range(3):
+            for index, vehicle in enumerate(state.fleet):
+                vehicle.wait_counter = (index + tick) % 7
+            writer.write(state, tick)
+
+    frames = list(TraceReader(str(path)).frames())
+    assert [frame.tick for frame in frames] == [0, 1, 2]
+    for tick, frame in enumerate(frames):
+        assert len(frame.vehicles) == 300
+        assert [v.pos for v in frame.vehicles] == [vehicle.pos for vehicle in state.fleet]
+        assert [v.wait_counter for v in frame.vehicles] == [(index + tick) % 7 for index in range(300)]
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+import pygame
+
+# pygame.font.SysFont scans the installed fonts on every call, so fonts are
+# created once per (name, size, bold) and rendered text is memoized.
+_FONTS = {}
+_TEXTS = OrderedDict()   # (text, name, size, bold, color) -> surface, least recently used first
+MAX_TEXTS = 512          # Rendered surfaces kept before the oldest are evicted
+
+
+def get_font(name=None, size=24, bold=False):
+    """Returns the shared SysFont for (name, size, bold)."""
+    key = (name, size, bold)
+    font = _FONTS.get(key)
+    if font is None:
+        font = _FONTS[key] = pygame.font.SysFont(name, size, bold=bold)
+    return font
+
+
+def render_text(text, size=24, color=(0, 0, 0), name=None, bold=False):
+    """
+    Returns the antialiased surface of `text`, rendering it only on a cache
+    miss. The surface is shared: blit it, never draw on it.
+    """
+    key = (text, name, size, bold, color)
+    surface = _TEXTS.get(key)
+    if surface is not None:
+        _TEXTS.move_to_end(key)
+        return surface
+    surface = _TEXTS[key] = get_font(name, size, bold).render(text, True, color)
+    if len(_TEXTS) > MAX_TEXTS:
+        _TEXTS.popitem(last=False)
+    return surface
+
+
+def clear():
+    """Drops every cached font and surface (e.g. after pygame.font.quit())."""
+    _FONTS.clear()
+    _TEXTS.clear()
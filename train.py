@@ -1,11 +1,23 @@
 from environment import HybridEnvironment
 from qlearning import QLearningAgent
+from mapgen import MapPool, use_pool
+from rng import SimulationRNG
+from settings import ROWS, COLS, SEED
 
-env = HybridEnvironment()
+rng = SimulationRNG(SEED)
 agent = QLearningAgent()
 
+# Large maps are generated in the background during training, small ones inline
+pool = MapPool(rng, ROWS, COLS) if use_pool(ROWS, COLS) else None
+env = HybridEnvironment(rng, pool=pool)
+
 # Eğitim yoksa yapılır, varsa yüklenir
-agent.train(env, episodes=10000)
+try:
+    agent.train(env, episodes=10000)
+finally:
+    if pool:
+        pool.close()
+        env.pool = None  # Later resets generate their maps inline
 
 # Test
 state = env.reset()
@@ -1,11 +1,23 @@
 from grid import Cell
 from yolo import contains_human
-from settings import CELL_SIZE
+from settings import CELL_SIZE, ROWS, COLS, PREDICTION_THRESHOLD, PREDICTION_WEIGHT, EVENT_LOG_CAPACITY, INFERENCE_SERVER
 from astar import astar
+from profiler import profiler
+from state_encoder import state_index, decode_state
+from prediction import occupancy_cost, predicted_conflict
+from text_cache import render_text
+from inference_server import get_client
+import event_log
+from event_log import EventLog
 import pygame
 import pickle
 import numpy as np
 
+# Q-tables are shared by every vehicle, so rebuilding vehicles (restart,
+# clean, snapshot restore) does not hit the disk again. Sprites come from
+# grid's image cache.
+_Q_TABLES = {}
+
 
 class Vehicle:
     """
@@ -18,12 +30,29 @@ class Vehicle:
         self.step = 0         # Index in the path list for next move
         self.angle = 0        # Rotation angle for rendering orientation
         self.y_initial = 0    # Y coordinate for drawing info panel text
-        self.warnings = []    # Log of warnings and RL decisions for display
+        self.events = EventLog(EVENT_LOG_CAPACITY)  # Recent detections, waits and RL decisions
+        self.img_type = img_type
         self.original_image = Cell(self.pos[0], self.pos[1], img_type).image  # Vehicle sprite
         self.destinations = destination_queue or []  # Queue of subsequent targets
         self.current_target = initial_target or (self.destinations[0] if self.destinations else start_pos)
         self.wait_counter = 0  # Counts how long vehicle has been waiting (e.g., for humans)
-        self.q_table = self.load_q_table("off.pkl")  # Pretrained Q-table for RL agent
+        # Pretrained Q-table for RL agent; with an inference server the server holds the only copy
+        self.q_table = None if INFERENCE_SERVER else self.load_q_table("off.pkl")
+        self.planner = astar   # Path planner: planner(start, goal, grid, cost_map=None) -> path
+        self.detections = None # YOLO results prefetched for this tick, {(r, c): confidence}
+        self.occupancy = None  # Predicted pedestrian occupancy for the next ticks, (horizon, rows, cols)
+        self.last_state = None   # RL state computed this tick, None if the agent was not asked
+        self.last_action = None  # RL action chosen this tick, None if the agent was not asked
+        self.encoded_state = None  # (pos, next cell, state index) encoded for the whole fleet this tick
+        self.encoded_action = None # (state index, best action) fetched for the whole fleet this tick
+        self._panel = None         # Composited information panel, see compose_panel()
+        self._panel_version = None # Event log version the panel was composited for
+        self._panel_lines = 0
+
+    @property
+    def warnings(self):
+        """Formatted text of the buffered events (kept for older callers)."""
+        return self.events.lines()
 
     def get_next_position(self):
         """Returns the next position in the path or None if at the end."""
@@ -52,6 +81,17 @@ class Vehicle:
             return [(r, c + 1), (r - 1, c + 1), (r + 1, c + 1)]
         return []
 
+    def detect(self, screen, r, c):
+        """
+        Returns the YOLO human confidence (or False) for grid cell (r, c).
+        Uses the detections prefetched for this tick when available.
+        """
+        if self.detections is not None and (r, c) in self.detections:
+            return self.detections[(r, c)]
+        sub_surface = screen.subsurface(c * CELL_SIZE, r * CELL_SIZE, CELL_SIZE, CELL_SIZE).copy()
+        with profiler.phase("yolo"):
+            return contains_human(sub_surface)
+
     def check_front_for_humans(self, screen):
         """
         Scans the cells in front of the vehicle to detect humans using YOLO.
@@ -59,33 +99,54 @@ class Vehicle:
         """
         front_cells = self.get_front_cells()
         for r, c in front_cells:
-            if 0 <= r < 10 and 0 <= c < 10:
-                sub_surface = screen.subsurface(c * CELL_SIZE, r * CELL_SIZE, CELL_SIZE, CELL_SIZE).copy()
-                confidence = contains_human(sub_surface)
+            if 0 <= r < ROWS and 0 <= c < COLS:
+                confidence = self.detect(screen, r, c)
                 if confidence:
-                    self.warnings.append(f"--->Human detected: {r},{c} with confidence: {round(confidence, 2)}")
+                    self.events.log(event_log.HUMAN, cell=(r, c), confidence=confidence)
                     return True
         return False
 
     def move(self, screen, grid):
         """
         Moves the vehicle  along the path if no human detected.
-        If humans detected, waits for 3 seconds and then uses RL agent to decide next action.
+        If humans detected, waits for 3 ticks and then uses RL agent to decide next action.
+        Before that, replans around pedestrians predicted to cross the path.
         """
+        self.avoid_predicted_pedestrians(grid)
         if not self.check_front_for_humans(screen):
             self.wait_counter = 0
             self.follow_path(grid)
         else:
             self.wait_counter += 1
-            self.warnings.append(f"--> waited for {self.wait_counter} seconds .")
+            self.events.log(event_log.WAITED, value=self.wait_counter)
             if self.wait_counter >= 3:
-                state = self.get_rl_state(screen)
+                with profiler.phase("rl_state"):
+                    state = self.get_rl_state(screen)
                 action = self.get_best_action(state)
-                action_names = ["Wait", "Forward", "Right", "Left"]
-                self.warnings.append(f"--> RL agent for the state {state}  choose the action'{action_names[action]}'")
+                self.last_state, self.last_action = state, action
+                self.events.log(event_log.RL_DECISION, action=action, value=state_index(state))
                 self.apply_rl_action(action, grid)
                 self.wait_counter = 0
 
+    def avoid_predicted_pedestrians(self, grid):
+        """
+        Checks the next cells of the path against the predicted pedestrian
+        occupancy (cell k+1 ahead against tick k) and, if a conflict is
+        likely, replans with the occupancy as extra cost so the vehicle
+        routes around it instead of stopping in front of it.
+        """
+        if self.occupancy is None or self.step >= len(self.path):
+            return
+        if not predicted_conflict(self.path, self.step, self.occupancy, PREDICTION_THRESHOLD):
+            return
+        cost_map = occupancy_cost(self.occupancy, PREDICTION_WEIGHT)
+        with profiler.phase("astar"):
+            new_path = self.planner(self.pos, self.current_target, grid, cost_map)
+        if new_path and new_path != self.path[self.step:]:
+            self.path = new_path
+            self.step = 0
+            self.events.log(event_log.REPLANNED)
+
     def move_normal(self, screen, grid):
         """
         Moves the vehicle normally forward if no human detected.
@@ -122,7 +183,8 @@ class Vehicle:
             if self.destinations:
                 self.current_target = self.destinations.pop(0)
             next_destination = self.current_target or self.pos
-            new_path = astar(self.pos, next_destination, grid)
+            with profiler.phase("astar"):
+                new_path = self.planner(self.pos, next_destination, grid)
             if new_path and len(new_path) > 1:
                 self.path = new_path
                 self.step = 0
@@ -156,20 +218,20 @@ class Vehicle:
         Actions: 0=Wait, 1=Forward, 2=Turn Right, 3=Turn Left
         """
         if action == 0:
-            self.warnings.append("--> Car is waiting")
+            self.events.log(event_log.ACTION, action=0)
         elif action == 1:
-            self.warnings.append("--> Car is trying to go forward")
+            self.events.log(event_log.ACTION, action=1)
             self.follow_path(grid)
         elif action == 2:
             # Check if right lane is blocked before turning right
             if self.front_right_is_building(grid):
-                self.warnings.append("--> Right blocked by building, trying left")
+                self.events.log(event_log.ACTION, action=2, value=True)
                 self.change_lane(grid, direction=-1)  # Change lane left
             else:
-                self.warnings.append("--> Car is trying to go right")
+                self.events.log(event_log.ACTION, action=2)
                 self.change_lane(grid, direction=1)   # Change lane right
         elif action == 3:
-            self.warnings.append("--> Car is trying to go left")
+            self.events.log(event_log.ACTION, action=3)
             self.change_lane(grid, direction=-1)      # Change lane left
 
     def change_lane(self, grid, direction):
@@ -195,20 +257,24 @@ class Vehicle:
                 if target == self.pos:
                     return
 
-                new_path = astar(self.pos, target, grid)
+                with profiler.phase("astar"):
+                    new_path = self.planner(self.pos, target, grid)
                 if new_path and len(new_path) > 1:
                     self.path = new_path
                     self.step = 0
-                    self.warnings.append("--> New path calculated.")
+                    self.events.log(event_log.NEW_PATH)
 
     def get_rl_state(self, screen):
         """
         Constructs a state tuple representing presence of humans in
         front-left, front, and front-right cells detected by YOLO.
-        Used as input to the RL agent.
+        Used as input to the RL agent. The state encoded by the fleet for
+        this tick is reused while the vehicle still has the same heading.
         """
         if self.step >= len(self.path):
             return (0, 0, 0)
+        if self.encoded_state is not None and self.encoded_state[:2] == (self.pos, self.path[self.step]):
+            return decode_state(self.encoded_state[2])
 
         r, c = self.pos
         nr, nc = self.path[self.step]
@@ -224,9 +290,8 @@ class Vehicle:
 
         state = []
         for i, j in front:
-            if 0 <= i < 10 and 0 <= j < 10:
-                sub_surface = screen.subsurface(j * CELL_SIZE, i * CELL_SIZE, CELL_SIZE, CELL_SIZE).copy()
-                confidence = contains_human(sub_surface)
+            if 0 <= i < ROWS and 0 <= j < COLS:
+                confidence = self.detect(screen, i, j)
                 state.append(1 if confidence else 0)
             else:
                 state.append(0)
@@ -235,20 +300,49 @@ class Vehicle:
     def get_best_action(self, state):
         """
         Maps the RL state tuple to an index and returns the best action
-        from the loaded Q-table.
+        from the loaded Q-table, or from the inference server (reusing the
+        action the fleet fetched for this tick when the state matches).
         """
-        idx = state[0] * 4 + state[1] * 2 + state[2] * 1
-        return int(np.argmax(self.q_table[idx]))
+        if self.q_table is None:
+            index = state_index(state)
+            if self.encoded_action is not None and self.encoded_action[0] == index:
+                return self.encoded_action[1]
+            return get_client().best_actions([index])[0]
+        return int(np.argmax(self.q_table[state_index(state)]))
 
     def load_q_table(self, path):
-        """Loads the pretrained Q-table for RL from file."""
-        with open(path, 'rb') as f:
-            return pickle.load(f)
+        """Loads the pretrained Q-table for RL from file (once per path)."""
+        if path not in _Q_TABLES:
+            with open(path, 'rb') as f:
+                _Q_TABLES[path] = pickle.load(f)
+        return _Q_TABLES[path]
+
+    def compose_panel(self):
+        """
+        Renders the information panel (title box and the last 25 events)
+        onto its own transparent surface, so frames where no event was
+        logged cost a single blit. Events are formatted only here.
+        """
+        box_width, box_height = 300, 35
+        lines = self.events.lines(25)
+        panel = pygame.Surface((box_width, box_height + 10 + 20 * 25), pygame.SRCALPHA)
+        pygame.draw.rect(panel, (0, 102, 102), (0, 0, box_width, box_height), border_radius=6)
+        pygame.draw.rect(panel, (0, 51, 51), (0, 0, box_width, box_height), 2, border_radius=6)
+
+        title_text = render_text("Vehicle Information Panel", 24, (255, 255, 255), bold=True)
+        panel.blit(title_text, title_text.get_rect(center=(box_width // 2, box_height // 2)))
+
+        y = box_height + 10
+        for sentence in lines:
+            panel.blit(render_text(sentence, 22, (0, 153, 153)), (10, y))
+            y += 20
+        return panel, len(lines)
 
     def draw(self, surface, draw_info=True):
         """
         Draws the vehicle image rotated according to its orientation.
-        Optionally draws an information panel with recent warnings and decisions.
+        Optionally draws an information panel with recent events and decisions;
+        the panel is re-composited only when an event is logged.
         """
         self.y_initial = 20
         rotated = pygame.transform.rotate(self.original_image, self.angle)
@@ -256,18 +350,9 @@ class Vehicle:
 
         if draw_info:
             box_x, box_y = 840, 10
-            box_width, box_height = 300, 35
-            pygame.draw.rect(surface, (0, 102, 102), (box_x, box_y, box_width, box_height), border_radius=6)
-            pygame.draw.rect(surface, (0, 51, 51), (box_x, box_y, box_width, box_height), 2, border_radius=6)
-
-            font_title = pygame.font.SysFont(None, 24, bold=True)
-            title_text = font_title.render("Vehicle Information Panel", True, (255, 255, 255))
-            title_rect = title_text.get_rect(center=(box_x + box_width // 2, box_y + box_height // 2))
-            surface.blit(title_text, title_rect)
-
-            font = pygame.font.SysFont(None, 22)
-            self.y_initial = box_y + box_height + 10
-            for sentence in self.warnings[-25:]:
-                text = font.render(sentence, True, (0, 153, 153))
-                surface.blit(text, (box_x + 10, self.y_initial))
-                self.y_initial += 20
+            version = (id(self.events), self.events.version)
+            if self._panel is None or self._panel_version != version:
+                self._panel, self._panel_lines = self.compose_panel()
+                self._panel_version = version
+            surface.blit(self._panel, (box_x, box_y))
+            self.y_initial = box_y + 35 + 10 + 20 * self._panel_lines
@@ -1,9 +1,13 @@
+import argparse
 import pygame
 import numpy as np
 import cv2
-from ultralytics import YOLO
+from inference_server import get_client
+from settings import DETECTOR_BACKEND, DETECTOR_WEIGHTS, DETECTOR_ONNX_PATH, DETECTOR_INPUT_SIZE, DETECTOR_CONFIDENCE
 
-model = YOLO("yolov8n.pt")
+INPUT_SIZE = 224                  # Crops are upscaled to this size before detection
+INTERPOLATION = cv2.INTER_CUBIC   # Resize filter used for the upscaling
+PERSON = 0                        # COCO class id of a human
 
 def surface_to_numpy(surface): #transform ths image to numpy array
 
@@ -11,20 +15,147 @@ def surface_to_numpy(surface): #transform ths image to numpy array
     image = np.frombuffer(raw, dtype=np.uint8).reshape((surface.get_height(), surface.get_width(), 3))
     return image
 
+def preprocess(image, size=INPUT_SIZE, interpolation=INTERPOLATION): #RGB crop -> resized BGR image for the model
+
+    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    return cv2.resize(image, (size, size), interpolation=interpolation)
+
+def person_confidence(result): #Confidence of the first human box of one result, False if there is none
+
+    for box in result.boxes:
+        if int(box.cls[0]) == PERSON:
+            return float(box.conf[0])
+    return False
+
+
+class UltralyticsDetector:
+    """
+    Full-precision YOLO through ultralytics, all 80 COCO classes with NMS.
+    Called with preprocessed BGR images, returns one human confidence
+    (or False) per image.
+    """
+    def __init__(self, weights=DETECTOR_WEIGHTS):
+        from ultralytics import YOLO
+        self.model = YOLO(weights)
+        self.input_size = INPUT_SIZE
+
+    def __call__(self, images, imgsz=None):
+        options = {"verbose": False}
+        if imgsz:
+            options["imgsz"] = imgsz  # Network input resolution; the default letterboxes to 640
+        return [person_confidence(r) for r in self.model.predict(list(images), **options)]
+
+
+class OnnxDetector:
+    """
+    Exported (optionally int8-quantized) YOLOv8 model run by onnxruntime on
+    the CPU at a fixed input size. Only the class scores of the raw
+    (batch, 4 + classes, anchors) output are read: ultralytics labels each
+    anchor with its best class, so the best person score among anchors
+    labelled person is the confidence it would report for its top human
+    box. Box decoding and NMS are skipped entirely.
+    """
+    def __init__(self, path=DETECTOR_ONNX_PATH, input_size=DETECTOR_INPUT_SIZE, confidence=DETECTOR_CONFIDENCE, threads=0):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads  # 0 lets the runtime pick
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        height = model_input.shape[2]
+        # Models exported with a static shape dictate the input size
+        self.input_size = height if isinstance(height, int) else input_size
+        self.fixed_size = isinstance(height, int)
+        self.confidence = confidence
+
+    def __call__(self, images, imgsz=None):
+        if imgsz and self.fixed_size and imgsz != self.input_size:
+            raise ValueError(f"the onnx model has a fixed {self.input_size}px input and cannot run at {imgsz}px")
+        size = imgsz or self.input_size
+        batch = np.stack([
+            image if image.shape[0] == size else cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
+            for image in images
+        ])
+        # BGR uint8 NHWC -> RGB float NCHW in [0, 1], as ultralytics feeds the network
+        batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        output = self.session.run(None, {self.input_name: batch})[0]
+        classes = output[:, 4:, :]
+        is_person = classes.argmax(axis=1) == PERSON
+        scores = np.where(is_person, classes[:, PERSON, :], 0.0).max(axis=1)
+        return [float(score) if score >= self.confidence else False for score in scores]
+
+
+BACKENDS = {
+    "ultralytics": UltralyticsDetector,
+    "onnx": OnnxDetector,
+}
+
+_detector = None
+
+def get_detector(): #The configured detector, loaded on first use
+
+    global _detector
+    if _detector is None:
+        _detector = BACKENDS[DETECTOR_BACKEND]()
+    return _detector
+
+def detect(images, imgsz=None): #Run the detector once on preprocessed images, one confidence (or False) each
+
+    if not len(images):
+        return []
+    return get_detector()(images, imgsz)
+
 def contains_human(surface): #Check image if it contains human
 
+    client = get_client()
+    if client:
+        return client.detect([surface_to_numpy(surface)])[0]
+    detector = get_detector()
+    image = preprocess(surface_to_numpy(surface), detector.input_size)  # Daha kaliteli büyütme
+    return detector([image])[0]
 
-    image = surface_to_numpy(surface)
+def contains_human_batch(surfaces): #Check several images with a single predict call
 
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-    image = cv2.resize(image, (224, 224), interpolation=cv2.INTER_CUBIC)  # Daha kaliteli büyütme
+    client = get_client()
+    if client:
+        return client.detect([surface_to_numpy(surface) for surface in surfaces])
+    size = get_detector().input_size
+    return detect([preprocess(surface_to_numpy(surface), size) for surface in surfaces])
 
-    results = model.predict(image, verbose=False)
-    for r in results:
-        for box in r.boxes:
-            conf = None
 
-            if int(box.cls[0]) == 0:  #human id is 0
-                conf = float(box.conf[0])
-                return conf
-    return False
+def export_onnx(weights=DETECTOR_WEIGHTS, imgsz=DETECTOR_INPUT_SIZE, int8=False, output=None):
+    """
+    Exports the weights to ONNX at a fixed input size with a dynamic batch
+    axis and, with int8, quantizes the weights dynamically. Returns the path
+    of the resulting model.
+    """
+    import shutil
+    import onnx
+    from ultralytics import YOLO
+    # ultralytics' dynamic export frees every input axis; pin height and width back
+    path = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    model = onnx.load(path)
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    dims[2].dim_value = imgsz
+    dims[3].dim_value = imgsz
+    onnx.save(model, path)
+    if int8:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantized = path.replace(".onnx", "-int8.onnx")
+        quantize_dynamic(path, quantized, weight_type=QuantType.QUInt8)
+        path = quantized
+    if output:
+        shutil.move(path, output)
+        path = output
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the pedestrian detector for the onnx backend.")
+    parser.add_argument("--weights", default=DETECTOR_WEIGHTS, help="Ultralytics weights to export")
+    parser.add_argument("--imgsz", type=int, default=DETECTOR_INPUT_SIZE, help="Fixed input size of the exported model")
+    parser.add_argument("--int8", action="store_true", help="Quantize the weights to int8")
+    parser.add_argument("--output", help="Where to write the model (default: next to the weights)")
+    args = parser.parse_args()
+    print(export_onnx(args.weights, args.imgsz, args.int8, args.output))